@@ -1,17 +1,253 @@
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLineEdit, QTextEdit, QPushButton, QMessageBox
 from PyQt5 import QtGui
-from PyQt5.QtGui import QIcon
-from groq import Groq
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QIcon, QTextCursor
+from groq import AuthenticationError, Groq
+from collections import OrderedDict
+import hashlib
+import json
 import os
 import html
+import time
+
+MODEL = "llama3-70b-8192"
+CACHE_FILE = 'response_cache.json'
+CODE_STYLE = "font-family: monospace; background-color: #f0f0f0;"
+
+def render_inline(text):
+    """Renders **bold** and `code` in one line of text to HTML in a single left-to-right pass.
+
+    The next position of each marker is searched for only once it has been passed, and a failed search
+    means there is none later on the line, so no character is scanned more than a constant number of times.
+    An opening marker without a closing one is kept as literal text and scanning continues after it.
+    """
+    out = []
+    i = 0
+    tick = text.find('`')
+    star = text.find('**')
+    while True:
+        if 0 <= tick < i:
+            tick = text.find('`', i)
+        if 0 <= star < i:
+            star = text.find('**', i)
+        if tick < 0 and star < 0:
+            break
+        if star < 0 or 0 <= tick < star:
+            close = text.find('`', tick + 1)
+            if close < 0:
+                out.append(html.escape(text[i:tick + 1]))  # No backtick follows, so none can open a span
+                i = tick + 1
+                tick = -1
+                continue
+            out.append(html.escape(text[i:tick]))
+            out.append(f"<code style='{CODE_STYLE}'>{html.escape(text[tick + 1:close])}</code>")
+            i = close + 1
+        else:
+            close = text.find('**', star + 2)
+            if close < 0:
+                out.append(html.escape(text[i:star + 2]))  # No ** follows, so none can open bold
+                i = star + 2
+                star = -1
+                continue
+            out.append(html.escape(text[i:star]))
+            out.append(f"<b>{render_inline(text[star + 2:close])}</b>")
+            i = close + 2
+    out.append(html.escape(text[i:]))
+    return ''.join(out)
+
+class MarkdownRenderer:
+    """Incremental Markdown to HTML renderer for bold, inline code and ``` fenced blocks.
+
+    feed() takes appended chunks of a streamed response and returns the HTML of the lines they complete,
+    rendering each line once. The unfinished last line is kept as its chunks; pending_text() joins them so
+    it can be shown as plain text until a newline or finish() renders it.
+    """
 
-class MyApp(QWidget):
     def __init__(self):
+        self.partial = []  # Pieces of the current, unfinished line
+        self.in_fence = False
+
+    def render_line(self, line):
+        if line.lstrip().startswith('```'):
+            self.in_fence = not self.in_fence
+            return ''
+        if self.in_fence:
+            code = html.escape(line.expandtabs(4)).replace(' ', '&nbsp;')
+            return f"<span style='{CODE_STYLE}'>{code}</span><br>"
+        return render_inline(line) + '<br>'
+
+    def feed(self, chunk):
+        lines = chunk.split('\n')
+        if len(lines) == 1:
+            self.partial.append(chunk)
+            return ''
+        self.partial.append(lines[0])
+        out = [self.render_line(''.join(self.partial))]
+        out.extend(self.render_line(line) for line in lines[1:-1])
+        self.partial = [lines[-1]]
+        return ''.join(out)
+
+    def pending_text(self):
+        return ''.join(self.partial)
+
+    def finish(self):
+        line = ''.join(self.partial)
+        self.partial = []
+        return self.render_line(line) if line else ''
+
+def read_api_key():
+    if os.path.exists('key.txt'):
+        with open('key.txt', 'r') as key:
+            return key.read().strip()
+    return None
+
+def estimate_tokens(message):
+    """Rough token count of a chat message: about four characters per token plus a few for the role."""
+    return len(message["content"]) // 4 + 4
+
+def trim_history(messages, token_budget):
+    """Drops the oldest messages until the estimate fits token_budget; the last message is always kept."""
+    total = sum(estimate_tokens(message) for message in messages)
+    start = 0
+    while start < len(messages) - 1 and total > token_budget:
+        total -= estimate_tokens(messages[start])
+        start += 1
+    return messages[start:]
+
+class ResponseCache:
+    """LRU cache of completed responses, keyed by model and whitespace-normalized messages.
+
+    Entries expire ttl seconds after they were stored. The cache is kept in memory and mirrored to a
+    JSON file, so repeated prompts are answered without a request across restarts too.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=256, ttl=24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored at, response), least recently used first
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    for key, (stored, response) in json.load(f):
+                        self.entries[key] = (stored, response)
+            except (OSError, ValueError):
+                self.entries.clear()  # A damaged cache file is just a cold cache
+            self.evict()
+
+    @staticmethod
+    def key(model, messages):
+        normalized = [[message["role"], ' '.join(message["content"].split())] for message in messages]
+        return hashlib.sha256(json.dumps([model, normalized]).encode()).hexdigest()
+
+    def evict(self):
+        now = time.time()
+        for key in [key for key, (stored, _) in self.entries.items() if now - stored > self.ttl]:
+            del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, response):
+        self.entries[key] = (time.time(), response)
+        self.entries.move_to_end(key)
+        self.evict()
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(list(self.entries.items()), f)
+            os.replace(temp_path, self.path)  # Atomic, so a crash never leaves a half-written cache
+        except OSError:
+            pass  # The disk mirror is best effort; the in-memory cache still works
+
+class CompletionWorker(QThread):
+    """Runs one streaming chat completion off the GUI thread and emits the text as it arrives.
+
+    cancel() may be called from the GUI thread. run() then stops at the next chunk, closes the response
+    from its own thread and emits nothing more. The response is not closed from the GUI thread, because
+    the client's pooled connection is not safe to close while another thread is reading from it.
+    """
+    token = pyqtSignal(str)
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    unauthorized = pyqtSignal(str)
+
+    def __init__(self, client, messages, model=MODEL):
+        super().__init__()
+        self.client = client
+        self.messages = messages
+        self.model = model
+        self.stream = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        parts = []
+        try:
+            self.stream = self.client.chat.completions.create(messages=self.messages, model=self.model, stream=True)
+            for chunk in self.stream:
+                if self.cancelled:
+                    self.stream.close()  # Drops the connection instead of reading the rest of the reply
+                    return
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    self.token.emit(delta)  # Queued to the GUI thread, which appends it to the output
+        except AuthenticationError as error:
+            if not self.cancelled:
+                self.unauthorized.emit(str(error))
+            return
+        except Exception as error:
+            if not self.cancelled:
+                self.failed.emit(str(error))
+            return
+        if not self.cancelled:
+            self.completed.emit(''.join(parts))
+
+class MyApp(QWidget):
+    def __init__(self, base_url=None, cache=None, history_tokens=6000):
         super().__init__()
+        self.base_url = base_url
+        self.client = None
+        self.worker = None
+        self.retired = []  # Cancelled workers, kept referenced until their threads end
+        self.request_id = 0  # Bumped by Clear, so signals of an abandoned request are ignored
+        self.renderer = MarkdownRenderer()
+        self.rendered_end = 0  # Document position where the rendered HTML ends and the pending line begins
+        self.cache = cache
+        self.history = []  # Earlier user and assistant messages of this conversation
+        self.history_tokens = history_tokens
+        self.pending_messages = None
 
         self.initUI()
 
+    def get_client(self):
+        """The one Groq client of the app; its HTTP connection pool is reused by every request."""
+        if self.client is None:
+            api_key_text = read_api_key()
+            if api_key_text is None:
+                return None
+            self.client = Groq(api_key=api_key_text, base_url=self.base_url)
+        return self.client
+
     def initUI(self):
         self.setGeometry(300, 300, 1000, 700)
         self.setWindowTitle("GROQ GUI")
@@ -40,120 +276,132 @@ class MyApp(QWidget):
         self.show_popup()
 
     def onSubmit(self):
+        if self.worker is not None and self.worker.isRunning():
+            return  # One request at a time; the input is kept for later
         input_text = self.input_text.text()
         self.input_text.clear()  # Clear the input field
         self.output_text.clear()
         self.process_input(input_text)
 
     def process_input(self, input_text):
-        if os.path.exists('key.txt') == True:
-            key = open('key.txt', 'r')
-            api_key_text = key.read()
-
-            client = Groq(
-                api_key = api_key_text
-            )
-
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": input_text,
-                    }
-                ],
-                model="llama3-70b-8192",
-            )
-            
-            output_text = chat_completion.choices[0].message.content
-            formatted_text = self.format_text(output_text)
-            self.output_text.setHtml(formatted_text)
+        client = self.get_client()
+        if client is None:
+            return
+        messages = trim_history(self.history + [
+            {
+                "role": "user",
+                "content": input_text,
+            }
+        ], self.history_tokens)
+        self.pending_messages = messages
+        self.renderer = MarkdownRenderer()
+        self.rendered_end = 0
+        cached = self.cache.get(ResponseCache.key(MODEL, messages)) if self.cache else None
+        if cached is not None:
+            self.append_token(cached)
+            self.show_response(cached)
+            return
+        self.worker = CompletionWorker(client, messages)
+        self.worker.token.connect(self.current(self.append_token))
+        self.worker.completed.connect(self.current(self.store_response))
+        self.worker.completed.connect(self.current(self.show_response))
+        self.worker.failed.connect(self.current(self.show_error))
+        self.worker.unauthorized.connect(self.current(self.show_invalid_key))
+        self.worker.start()
 
-    def format_text(self, text):
-        # Escape HTML code
-        text = html.escape(text)
+    def current(self, slot):
+        """Wraps a slot so it only runs while the request it was connected for has not been cleared."""
+        request_id = self.request_id
+        return lambda *args: slot(*args) if request_id == self.request_id else None
+
+    def replace_tail(self, rendered_html, pending_text=''):
+        """Swaps the pending plain-text line for newly rendered HTML, then shows the new pending line."""
+        cursor = self.output_text.textCursor()
+        cursor.setPosition(self.rendered_end)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        if rendered_html:
+            cursor.insertHtml(rendered_html)
+        self.rendered_end = cursor.position()
+        cursor.insertText(pending_text)
+
+    def append_token(self, token):
+        self.replace_tail(self.renderer.feed(token), self.renderer.pending_text())
+
+    def show_response(self, output_text):
+        self.replace_tail(self.renderer.finish())
+        messages = self.pending_messages
+        self.history = messages + [{"role": "assistant", "content": output_text}]
 
-        # Format **bold** text
-        while "**" in text:
-            start = text.find("**")
-            end = text.find("**", start + 2)
-            bold_text = text[start + 2:end]
-            text = text.replace("**" + bold_text + "**", "<b>" + bold_text + "</b>", 1)
+    def store_response(self, output_text):
+        if self.cache:
+            self.cache.put(ResponseCache.key(MODEL, self.pending_messages), output_text)
 
-        # Format ````code block```` text
-        text = text.replace("```", "<code><pre style='background-color: #f0f0f0; padding: 5px;'>")
-        text = text.replace("```", "</pre></code>")
+    def show_error(self, message):
+        self.output_text.append(f"Request failed: {message}")
 
-        # Add HTML and body tags
-        text = "<html><head><style>code { background-color: #f0f0f0; padding: 5px; }</style></head><body>" + text + "</body></html>"
+    def format_text(self, text):
+        renderer = MarkdownRenderer()
+        body = renderer.feed(text) + renderer.finish()
+        return "<html><body>" + body + "</body></html>"
 
-        return text
+    def closeEvent(self, event):
+        # A QThread destroyed while running aborts the process, so stop the stream and let the thread end
+        for worker in self.retired + [self.worker]:
+            if worker is not None and worker.isRunning():
+                worker.cancel()
+                worker.wait()
+        super().closeEvent(event)
 
     def clearOutput(self):
+        self.request_id += 1
+        if self.worker is not None and self.worker.isRunning():
+            worker = self.worker
+            worker.cancel()
+            self.retired.append(worker)
+            worker.finished.connect(lambda: self.retired.remove(worker))
+        self.worker = None
         self.output_text.clear()
+        self.renderer = MarkdownRenderer()
+        self.rendered_end = 0
+        self.pending_messages = None
+        self.history = []  # Start a new conversation
+
+    def show_message(self, icon, text, title):
+        msg = QMessageBox()
+        msg.setIcon(icon)
+        msg.setText(text)
+        msg.setWindowTitle(title)
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.setDefaultButton(QMessageBox.Ok)
+        msg.exec_()
+
+    def show_invalid_key(self, message):
+        self.client = None  # Rebuilt from key.txt on the next request, so a corrected key is picked up
+        self.show_message(QMessageBox.Critical, "Invalid Groq API key!", "Error")
 
     def show_popup(self):
-        if os.path.exists('key.txt') == True:
-            if not os.path.exists('api_key_valid.txt'):
-                key = open('key.txt', 'r')
-                api_key_text = key.read()
-
-                client = Groq(
-                    api_key = api_key_text
-                )
-
-                try:
-                    chat_completion = client.chat.completions.create(
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": "Hello",
-                            }
-                        ],
-                        model="llama3-70b-8192",
-                    )
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Information)
-                    msg.setText("Groq API key valid!")
-                    msg.setWindowTitle("Info")
-                    msg.setStandardButtons(QMessageBox.Ok)
-                    msg.setDefaultButton(QMessageBox.Ok)
-                    msg.exec_()
-                    with open('api_key_valid.txt', 'w') as f:
-                        f.write('True')
-                except:
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Critical)
-                    msg.setText("Invalid Groq API key!")
-                    msg.setWindowTitle("Error")
-                    msg.setStandardButtons(QMessageBox.Ok)
-                    msg.setDefaultButton(QMessageBox.Ok)
-                    msg.exec_()
-            else:
-                if not os.path.exists('key.txt'):
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Critical)
-                    msg.setText("You need a Groq API key in order to use this application! Put it in a new .txt file with a name 'key', and save in the same directory as the application.")
-                    msg.setWindowTitle("Error")
-                    msg.setStandardButtons(QMessageBox.Ok)
-                    msg.setDefaultButton(QMessageBox.Ok)
-                    msg.exec_()
-                    exit()
-        else:
-            msg = QMessageBox()
-            msg.setIcon(QMessageBox.Critical)
-            msg.setText("You need a Groq API key in order to use this application! Put it in a new .txt file with a name 'key', and save in the same directory as the application.")
-            msg.setWindowTitle("Error")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.setDefaultButton(QMessageBox.Ok)
-            msg.exec_()
+        # The key is validated lazily by the first request (see show_invalid_key), so starting the app needs
+        # no network round trip
+        if read_api_key() is None:
+            self.show_message(QMessageBox.Critical, "You need a Groq API key in order to use this application! Put it in a new .txt file with a name 'key', and save in the same directory as the application.", "Error")
             exit()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Chat with Groq models.")
+    parser.add_argument('--base-url', default=os.environ.get('GROQ_BASE_URL'), help="API endpoint, e.g. a local stand-in server for testing")
+    parser.add_argument('--history-tokens', type=int, default=6000, help="token budget of the conversation history sent with each prompt")
+    parser.add_argument('--cache-size', type=int, default=256, help="responses kept in the cache")
+    parser.add_argument('--cache-ttl', type=float, default=24, help="hours before a cached response expires")
+    parser.add_argument('--no-cache', action='store_true', help="always send prompts to the API")
+    args, qt_args = parser.parse_known_args()
+
     font = QtGui.QFont()
     font.setFamily("Arial")  # Set the font family
     font.setPointSize(14)  # Set the font size
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setFont(font)
-    ex = MyApp()
+    cache = None if args.no_cache else ResponseCache(CACHE_FILE, args.cache_size, args.cache_ttl * 3600)
+    ex = MyApp(args.base_url, cache, args.history_tokens)
     ex.show()
     sys.exit(app.exec_())
\ No newline at end of file
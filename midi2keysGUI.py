@@ -1,33 +1,351 @@
+import argparse
+import concurrent.futures
+import ctypes
+import hashlib
+import io
+import os
 import sys
-import pretty_midi
-import pyautogui
-from PyQt6.QtCore import Qt, QTimer
+import threading
+import time
+import numpy as np
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog, QLabel, QSlider
-from collections import defaultdict
 
-pyautogui.FAILSAFE = False
+NOTE_TO_KEY = {
+    'C3': '1', 'C#3': '!', 'D3': '2', 'D#3': '@', 'E3': '3', 'F3': '4', 'F#3': '$', 'G3': '5', 'G#3': '%', 'A3': '6', 'A#3': '^', 'B3': '7',
+    'C4': '8', 'C#4': '*', 'D4': '9', 'D#4': '(', 'E4': '0', 'F4': 'q', 'F#4': 'Q', 'G4': 'w', 'G#4': 'W', 'A4': 'e', 'A#4': 'E', 'B4': 'r',
+    'C5': 't', 'C#5': 'T', 'D5': 'y', 'D#5': 'Y', 'E5': 'u', 'F5': 'i', 'F#5': 'I', 'G5': 'o', 'G#5': 'O', 'A5': 'p', 'A#5': 'P', 'B5': 'a',
+    'C6': 's', 'C#6': 'S', 'D6': 'd', 'D#6': 'D', 'E6': 'f', 'F6': 'g', 'F#6': 'G', 'G6': 'h', 'G#6': 'H', 'A6': 'j', 'A#6': 'J', 'B6': 'k',
+    'C7': 'l', 'C#7': 'L', 'D7': 'z', 'D#7': 'Z', 'E7': 'x', 'F7': 'c', 'F#7': 'C', 'G7': 'v', 'G#7': 'V', 'A7': 'b', 'A#7': 'B', 'B7': 'n',
+    'C8': 'm'
+}
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+CHORD_TOLERANCE_MS = 5  # Onsets this close together are played as one chord
+SCHEDULE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'midi2keys')
+SCHEDULE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SCHEDULE_FORMAT_VERSION = 1
+LEAD_IN_SECONDS = 5.0  # Time to switch to the target window after starting
+
+def note_name(pitch):
+    """Same naming as pretty_midi.note_number_to_name, e.g. 60 -> 'C4'."""
+    return NOTE_NAMES[pitch % 12] + str(pitch // 12 - 1)
+
+def pitch_to_key_table(note_to_key):
+    """Resolves a note-name keymap into a 128-entry pitch -> key array ('' for unmapped pitches)."""
+    return np.array([note_to_key.get(note_name(pitch), '') for pitch in range(128)], dtype=object)
+
+class CompiledSchedule:
+    """Playback schedule: sorted chord times in ms, and per chord an index into a table of keystroke tuples."""
+
+    def __init__(self, times, chord_ids, chords):
+        self.times = times
+        self.chord_ids = chord_ids
+        self.chords = chords
+
+    def __len__(self):
+        return len(self.times)
+
+    def chord(self, index):
+        return self.chords[self.chord_ids[index]]
+
+def compile_schedule(midi_data, pitch_to_key, tolerance_ms=CHORD_TOLERANCE_MS):
+    """Turns the notes of every instrument into a CompiledSchedule.
+
+    Onsets closer than tolerance_ms to the previous one join its chord, and chords
+    without any mapped key are left out.
+    """
+    starts = [note.start for instrument in midi_data.instruments for note in instrument.notes]
+    pitches = [note.pitch for instrument in midi_data.instruments for note in instrument.notes]
+    starts_ms = np.round(np.array(starts, dtype=np.float64) * 1000).astype(np.int64)
+    pitches = np.array(pitches, dtype=np.intp)
+    order = np.lexsort((pitches, starts_ms))
+    starts_ms, pitches = starts_ms[order], pitches[order]
+    keys = pitch_to_key[pitches]
+    mapped = keys != ''
+    starts_ms, keys = starts_ms[mapped], keys[mapped]
+    if not len(starts_ms):
+        return CompiledSchedule(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), [])
+
+    boundaries = np.flatnonzero(np.diff(starts_ms) > tolerance_ms) + 1
+    times = starts_ms[np.concatenate(([0], boundaries))]
+    chord_table = {}
+    chord_ids = np.empty(len(times), dtype=np.int32)
+    for i, chord_keys in enumerate(np.split(keys, boundaries)):
+        chord = tuple(dict.fromkeys(chord_keys.tolist()))  # Unique keys, in pitch order
+        chord_ids[i] = chord_table.setdefault(chord, len(chord_table))
+    return CompiledSchedule(times, chord_ids, list(chord_table))
+
+def schedule_cache_key(midi_bytes, pitch_to_key, tolerance_ms=CHORD_TOLERANCE_MS):
+    """Hashes the file content together with everything that affects compilation."""
+    digest = hashlib.sha1(midi_bytes)
+    digest.update(f"{SCHEDULE_FORMAT_VERSION}|{tolerance_ms}|{'|'.join(pitch_to_key.tolist())}".encode())
+    return digest.hexdigest()
+
+def save_schedule(schedule, path):
+    # Keys of a chord are joined with a unit separator so the chord table is a plain string array
+    chords = np.array(['\x1f'.join(chord) for chord in schedule.chords], dtype=str)
+    temp_path = f"{path}.{os.getpid()}.tmp"  # Per process, since batch workers may write the same key at once
+    with open(temp_path, 'wb') as f:
+        np.savez(f, times=schedule.times, chord_ids=schedule.chord_ids, chords=chords)
+    os.replace(temp_path, path)  # Atomic, so a crash never leaves a half-written schedule
+
+def read_schedule(path):
+    with np.load(path) as data:
+        chords = [tuple(chord.split('\x1f')) if chord else () for chord in data['chords'].tolist()]
+        return CompiledSchedule(data['times'], data['chord_ids'], chords)
+
+def evict_schedule_cache(cache_dir=SCHEDULE_CACHE_DIR, max_bytes=SCHEDULE_CACHE_MAX_BYTES):
+    """Deletes the least recently used cached schedules until the cache fits in max_bytes; returns how many."""
+    entries = []
+    removed = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.npz'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+def load_schedule(midi_path, pitch_to_key, tolerance_ms=CHORD_TOLERANCE_MS, cache_dir=SCHEDULE_CACHE_DIR, max_cache_bytes=SCHEDULE_CACHE_MAX_BYTES):
+    """Returns the CompiledSchedule of a MIDI file, from the on-disk cache when this content was compiled before."""
+    with open(midi_path, 'rb') as f:
+        midi_bytes = f.read()
+    path = os.path.join(cache_dir, schedule_cache_key(midi_bytes, pitch_to_key, tolerance_ms) + '.npz') if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            schedule = read_schedule(path)
+            os.utime(path)  # Mark as recently used for eviction
+            return schedule
+        except Exception:
+            pass  # Unreadable or truncated cache entry (e.g. BadZipFile), compile again below
+
+    import pretty_midi  # Slow to import, so only loaded when a file actually needs parsing
+    schedule = compile_schedule(pretty_midi.PrettyMIDI(io.BytesIO(midi_bytes)), pitch_to_key, tolerance_ms)
+    if path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_schedule(schedule, path)
+            evict_schedule_cache(cache_dir, max_cache_bytes)
+        except OSError:
+            pass  # Caching is best effort
+    return schedule
+
+class PyAutoGUIHotkeyBackend:
+    """The original injection: pyautogui.hotkey, which presses keys one by one and pauses after the call."""
+
+    def __init__(self):
+        import pyautogui  # Needs a display on Linux, so only imported when this backend is used
+        pyautogui.FAILSAFE = False
+        self.pyautogui = pyautogui
+
+    def press_chord(self, keys):
+        self.pyautogui.hotkey(*keys)
+
+class PyAutoGUIBackend(PyAutoGUIHotkeyBackend):
+    """Presses every key of a chord, then releases them all, without pyautogui's artificial pauses."""
+
+    def press_chord(self, keys):
+        for key in keys:
+            self.pyautogui.keyDown(key, _pause=False)
+        for key in keys:
+            self.pyautogui.keyUp(key, _pause=False)
+
+class SendInputBackend:
+    """Windows only: sends a whole chord's press and release events in a single SendInput call."""
+
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_KEYUP = 0x2
+    VK_SHIFT = 0x10
+
+    def __init__(self):
+        if sys.platform != 'win32':
+            raise OSError("SendInputBackend requires Windows")
+        from ctypes import wintypes
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                        ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                        ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class INPUTUNION(ctypes.Union):
+            _fields_ = [('ki', KEYBDINPUT), ('mi', MOUSEINPUT)]  # The mouse member gives the union its full size
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('union', INPUTUNION)]
+
+        self.INPUT = INPUT
+        self.KEYBDINPUT = KEYBDINPUT
+        self.user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self.key_codes = {}
+        self.chords = {}
+
+    def _key_code(self, key):
+        # VkKeyScanW packs the virtual-key code in the low byte and the shift state in the high byte
+        code = self.key_codes.get(key)
+        if code is None:
+            scan = self.user32.VkKeyScanW(ord(key))
+            code = self.key_codes[key] = (scan & 0xFF, bool(scan & 0x100))
+        return code
+
+    def _event(self, vk, up):
+        event = self.INPUT(type=self.INPUT_KEYBOARD)
+        event.union.ki = self.KEYBDINPUT(wVk=vk, wScan=self.user32.MapVirtualKeyW(vk, 0), dwFlags=self.KEYEVENTF_KEYUP if up else 0)
+        return event
+
+    def _build(self, keys):
+        codes = [self._key_code(key) for key in keys]
+        plain = [vk for vk, shifted in codes if not shifted]
+        shifted = [vk for vk, shifted in codes if shifted]
+        events = [self._event(vk, False) for vk in plain]
+        if shifted:
+            events += [self._event(self.VK_SHIFT, False)] + [self._event(vk, False) for vk in shifted] + [self._event(self.VK_SHIFT, True)]
+        events += [self._event(vk, True) for vk in plain + shifted]
+        return (self.INPUT * len(events))(*events)
+
+    def press_chord(self, keys):
+        events = self.chords.get(keys)
+        if events is None:
+            events = self.chords[keys] = self._build(keys)
+        self.user32.SendInput(len(events), events, ctypes.sizeof(self.INPUT))
+
+class RecordingBackend:
+    """Injects nothing; records (time.perf_counter(), keys) for every chord so playback can be checked headless."""
+
+    def __init__(self):
+        self.events = []
+
+    def press_chord(self, keys):
+        self.events.append((time.perf_counter(), keys))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            for timestamp, keys in self.events:
+                f.write(f"{timestamp:.6f}\t{''.join(keys)}\n")
+
+BACKENDS = {'sendinput': SendInputBackend, 'pyautogui': PyAutoGUIBackend, 'hotkey': PyAutoGUIHotkeyBackend, 'record': RecordingBackend}
+
+def default_backend_name():
+    return 'sendinput' if sys.platform == 'win32' else 'pyautogui'
+
+class ChordScheduler:
+    """Plays a CompiledSchedule from its own thread, firing each chord at an absolute deadline.
+
+    Deadlines come from one anchor on time.perf_counter (monotonic, high resolution), so late ticks and
+    time spent in fire() never accumulate. The thread sleeps until spin_ms before a deadline and busy-waits
+    the rest. Lateness of every fired chord is recorded; see stats(). If fire() raises, playback ends, the
+    exception is kept in error and on_finished is still called.
+    """
+
+    def __init__(self, schedule, fire, speed=1.0, spin_ms=1.0, on_finished=None):
+        self.schedule = schedule
+        self.fire = fire
+        self.speed = speed
+        self.spin = spin_ms / 1000
+        self.on_finished = on_finished
+        self.index = 0
+        self.lateness = np.zeros(len(schedule), dtype=np.float64)
+        self.fired = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.error = None
+        self.origin = 0.0  # Wall-clock time at which the score reaches anchor_ms
+        self.anchor_ms = 0
+
+    def start(self, from_index=0, lead_in=0.0):
+        self.index = from_index
+        with self.lock:
+            self.anchor_ms = int(self.schedule.times[from_index]) if from_index < len(self.schedule) else 0
+            self.origin = time.perf_counter() + lead_in
+        self.stopped.clear()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def set_speed(self, speed):
+        """Changes speed without moving the current score position."""
+        with self.lock:
+            now = time.perf_counter()
+            self.anchor_ms += (now - self.origin) * 1000 * self.speed
+            self.origin = now
+            self.speed = speed
+        self.wake.set()
+
+    def _deadline(self, index):
+        with self.lock:
+            return self.origin + (self.schedule.times[index] - self.anchor_ms) / 1000 / self.speed
+
+    def _run(self):
+        try:
+            while self.index < len(self.schedule) and not self.stopped.is_set():
+                self.wake.clear()
+                deadline = self._deadline(self.index)
+                remaining = deadline - time.perf_counter()
+                if remaining > self.spin:
+                    self.wake.wait(remaining - self.spin)
+                    continue  # Re-check: the wait may have been cut short by a stop or speed change
+                while time.perf_counter() < deadline:
+                    pass
+                self.lateness[self.fired] = time.perf_counter() - deadline
+                self.fired += 1
+                self.fire(self.schedule.chord(self.index))
+                self.index += 1
+        except Exception as error:
+            self.error = error  # The chord at self.index was not played; resuming starts from it
+        if (self.error is not None or not self.stopped.is_set()) and self.on_finished:
+            self.on_finished()
+
+    def stats(self):
+        """Returns lateness statistics in ms for the chords fired so far."""
+        lateness = self.lateness[:self.fired] * 1000
+        if not len(lateness):
+            return {'chords': 0}
+        return {
+            'chords': len(lateness),
+            'mean_ms': float(lateness.mean()),
+            'jitter_ms': float(lateness.std()),
+            'p50_ms': float(np.percentile(lateness, 50)),
+            'p95_ms': float(np.percentile(lateness, 95)),
+            'p99_ms': float(np.percentile(lateness, 99)),
+            'max_ms': float(lateness.max()),
+        }
 
 class MyApp(QWidget):
+    simulationFinished = pyqtSignal()
 
     def __init__(self):
         super().__init__()
 
         self.initUI()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.play_notes)
+        self.simulationFinished.connect(self.on_simulation_finished)
         self.speed_multiplier = 1.0
         self.current_event_index = 0
-        self.note_events = []
+        self.schedule = CompiledSchedule(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), [])
+        self.scheduler = None
+        self.backend_name = default_backend_name()
+        self.backend = None
         self.isPlaying = False
-        self.original_interval = 0
-        self.note_to_key = {
-            'C3': '1', 'C#3': '!', 'D3': '2', 'D#3': '@', 'E3': '3', 'F3': '4', 'F#3': '$', 'G3': '5', 'G#3': '%', 'A3': '6', 'A#3': '^', 'B3': '7',
-            'C4': '8', 'C#4': '*', 'D4': '9', 'D#4': '(', 'E4': '0', 'F4': 'q', 'F#4': 'Q', 'G4': 'w', 'G#4': 'W', 'A4': 'e', 'A#4': 'E', 'B4': 'r',
-            'C5': 't', 'C#5': 'T', 'D5': 'y', 'D#5': 'Y', 'E5': 'u', 'F5': 'i', 'F#5': 'I', 'G5': 'o', 'G#5': 'O', 'A5': 'p', 'A#5': 'P', 'B5': 'a',
-            'C6': 's', 'C#6': 'S', 'D6': 'd', 'D#6': 'D', 'E6': 'f', 'F6': 'g', 'F#6': 'G', 'G6': 'h', 'G#6': 'H', 'A6': 'j', 'A#6': 'J', 'B6': 'k',
-            'C7': 'l', 'C#7': 'L', 'D7': 'z', 'D#7': 'Z', 'E7': 'x', 'F7': 'c', 'F#7': 'C', 'G7': 'v', 'G#7': 'V', 'A7': 'b', 'A#7': 'B', 'B7': 'n',
-            'C8': 'm'
-        }
+        self.note_to_key = NOTE_TO_KEY
+        self.pitch_to_key = pitch_to_key_table(self.note_to_key)
+        self.chord_tolerance_ms = CHORD_TOLERANCE_MS
 
     def initUI(self):
         vbox = QVBoxLayout()
@@ -69,64 +387,166 @@ class MyApp(QWidget):
     def update_speed(self, value):
         self.speed_multiplier = value / 100.0
         self.speedLabel.setText(f"{value}%")
-        
-        if self.timer.isActive():
-            elapsed_time = self.original_interval - self.timer.remainingTime()
-            adjusted_elapsed_time = elapsed_time / self.speed_multiplier
-            remaining_time = self.original_interval - adjusted_elapsed_time
-            remaining_time = max(remaining_time, 0)
-            self.timer.setInterval(int(remaining_time))
+
+        if self.scheduler is not None:
+            self.scheduler.set_speed(self.speed_multiplier)
 
     def read_midi(self):
         self.midi_path, _ = QFileDialog.getOpenFileName(self, "Load MIDI file", "", "MIDI Files (*.mid *.midi);;All Files (*)")
         if self.midi_path:
             self.label.setText(f'Loaded {self.midi_path}')
-            midi_data = pretty_midi.PrettyMIDI(self.midi_path)
-            self.parse_midi(midi_data)
+            self.schedule = load_schedule(self.midi_path, self.pitch_to_key, self.chord_tolerance_ms)
             self.current_event_index = 0
 
     def parse_midi(self, midi_data):
-        timed_events = defaultdict(list)
-        
-        for instrument in midi_data.instruments:
-            for note in instrument.notes:
-                timed_events[note.start].append(note)
-                
-        sorted_times = sorted(timed_events.keys())
-        
-        self.note_events = []
-        for t in sorted_times:
-            self.note_events.append(('chord', timed_events[t]))
-
+        self.schedule = compile_schedule(midi_data, self.pitch_to_key, self.chord_tolerance_ms)
         self.current_event_index = 0
 
     def toggle_simulation(self):
         if not self.isPlaying:
+            if self.backend is None:
+                # Built here on the GUI thread, so a slow import does not delay the first chords
+                # and a missing dependency is shown instead of killing the scheduler thread
+                try:
+                    self.backend = BACKENDS[self.backend_name]()
+                except Exception as error:
+                    self.label.setText(f"Cannot use the {self.backend_name} backend: {error}")
+                    return
             self.simulationButton.setText('Stop Simulation')
-            self.timer.start(5000)
+            # The scheduler thread reports the end of the piece through a signal, back on the GUI thread
+            self.scheduler = ChordScheduler(self.schedule, self.press_chord, self.speed_multiplier, on_finished=self.simulationFinished.emit)
+            self.scheduler.start(self.current_event_index, lead_in=LEAD_IN_SECONDS)
             self.isPlaying = True
         else:
             self.simulationButton.setText('Start Simulation')
-            self.timer.stop()
+            self.scheduler.stop()
+            self.current_event_index = self.scheduler.index
             self.isPlaying = False
 
-    def play_notes(self):
-        if self.current_event_index < len(self.note_events):
-            event_type, event_data = self.note_events[self.current_event_index]
-            if event_type == 'chord':
-                chord_keys = [self.note_to_key.get(pretty_midi.note_number_to_name(note.pitch), '') for note in event_data]
-                chord_keys = [key for key in chord_keys if key]
-                if chord_keys:
-                    pyautogui.hotkey(*chord_keys)
-            self.current_event_index += 1
-            if self.current_event_index < len(self.note_events):
-                next_event_time = self.note_events[self.current_event_index][1][0].start
-                self.original_interval = int((next_event_time - event_data[0].start) * 1000)
-                self.timer.setInterval(int(self.original_interval / self.speed_multiplier))
+    def on_simulation_finished(self):
+        self.simulationButton.setText('Start Simulation')
+        self.isPlaying = False
+        if self.scheduler.error is not None:
+            self.current_event_index = self.scheduler.index
+            self.label.setText(f"Playback failed: {self.scheduler.error}")
+            return
+        self.current_event_index = 0
+        stats = self.scheduler.stats()
+        if stats['chords']:
+            self.label.setText(f"Finished {stats['chords']} chords: lateness p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+
+    def press_chord(self, keys):
+        self.backend.press_chord(keys)
+
+def record_playback(midi_path, speed=1.0, log_path=None):
+    """Plays a MIDI file into a RecordingBackend without a GUI and prints throughput and timing stats."""
+    schedule = load_schedule(midi_path, pitch_to_key_table(NOTE_TO_KEY))
+    backend = RecordingBackend()
+    finished = threading.Event()
+    scheduler = ChordScheduler(schedule, backend.press_chord, speed, on_finished=finished.set)
+    began = time.perf_counter()
+    scheduler.start()
+    if len(schedule):
+        finished.wait()
+    elapsed = time.perf_counter() - began
+    if scheduler.error is not None:
+        print(f"Playback failed after {scheduler.index} chords: {scheduler.error}")
+    keystrokes = sum(len(keys) for _, keys in backend.events)
+    print(f"{len(backend.events)} chords, {keystrokes} keystrokes in {elapsed:.2f} s")
+    for name, value in scheduler.stats().items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+    if log_path:
+        backend.save(log_path)
+    return scheduler.stats()
+
+def analyze_midi(midi_path, tolerance_ms=CHORD_TOLERANCE_MS, cache_dir=SCHEDULE_CACHE_DIR):
+    """Compiles one MIDI file and reports how well it fits NOTE_TO_KEY; also stores the schedule in the GUI's cache.
+
+    Runs in a worker process, so failures are returned in the report instead of raised.
+    """
+    report = {'path': midi_path}
+    try:
+        with open(midi_path, 'rb') as f:
+            midi_bytes = f.read()
+        import pretty_midi
+        midi_data = pretty_midi.PrettyMIDI(io.BytesIO(midi_bytes))
+        pitch_to_key = pitch_to_key_table(NOTE_TO_KEY)
+        schedule = compile_schedule(midi_data, pitch_to_key, tolerance_ms)
+    except Exception as error:
+        report['error'] = f"{type(error).__name__}: {error}"
+        return report
+
+    pitches = np.array([note.pitch for instrument in midi_data.instruments for note in instrument.notes], dtype=np.intp)
+    chord_sizes = np.array([len(chord) for chord in schedule.chords], dtype=np.int64)[schedule.chord_ids] if len(schedule) else np.zeros(0, dtype=np.int64)
+    # Most chords starting within any one second: for each chord, count those before its time + 1 s
+    window_counts = np.searchsorted(schedule.times, schedule.times + 1000, side='left') - np.arange(len(schedule))
+    report.update(
+        notes=len(pitches),
+        out_of_range=int(np.count_nonzero(pitch_to_key[pitches] == '')) if len(pitches) else 0,
+        chords=len(schedule),
+        peak_chords_per_second=int(window_counts.max()) if len(schedule) else 0,
+        largest_chord=int(chord_sizes.max()) if len(schedule) else 0,
+        keystrokes=int(chord_sizes.sum()),
+    )
+    if cache_dir:
+        path = os.path.join(cache_dir, schedule_cache_key(midi_bytes, pitch_to_key, tolerance_ms) + '.npz')
+        try:
+            if os.path.exists(path):
+                os.utime(path)  # Same content already cached, e.g. a duplicate file in the library
             else:
-                self.timer.stop()
+                os.makedirs(cache_dir, exist_ok=True)
+                save_schedule(schedule, path)
+        except OSError as error:
+            report['error'] = f"not cached: {error}"
+    return report
+
+def batch_compile(directory, workers=None, tolerance_ms=CHORD_TOLERANCE_MS, cache_dir=SCHEDULE_CACHE_DIR):
+    """Analyzes every MIDI file under directory in a process pool, yielding each report as soon as it is done."""
+    paths = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in sorted(names)
+             if name.lower().endswith(('.mid', '.midi'))]
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(analyze_midi, path, tolerance_ms, cache_dir) for path in paths]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+def print_batch(directory, workers=None, cache=True, max_cache_bytes=SCHEDULE_CACHE_MAX_BYTES):
+    print("out_of_range\tpeak_cps\tlargest_chord\tkeystrokes\tfile")
+    failed = unsuitable = done = 0
+    cache_dir = SCHEDULE_CACHE_DIR if cache else None
+    for report in batch_compile(directory, workers, cache_dir=cache_dir):
+        done += 1
+        if 'keystrokes' not in report:
+            failed += 1
+            print(f"-\t-\t-\t-\t{report['path']}\t{report['error']}", flush=True)
+            continue
+        unsuitable += report['out_of_range'] > 0
+        note = f"\t{report['error']}" if 'error' in report else ''
+        print(f"{report['out_of_range']}\t{report['peak_chords_per_second']}\t{report['largest_chord']}\t{report['keystrokes']}\t{report['path']}{note}", flush=True)
+    print(f"{done} files: {failed} failed, {unsuitable} with notes outside C3-C8", file=sys.stderr)
+    if cache_dir and os.path.isdir(cache_dir):
+        evicted = evict_schedule_cache(cache_dir, max_cache_bytes)
+        if evicted:
+            print(f"Evicted {evicted} cached schedules to stay under {max_cache_bytes // (1024 * 1024)} MB; raise --cache-max-mb to keep them all", file=sys.stderr)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Play MIDI files as keystrokes.")
+    parser.add_argument('--backend', choices=BACKENDS, default=default_backend_name(), help="keystroke injection backend")
+    parser.add_argument('--record', metavar='MIDI', help="play MIDI headless into the recording backend and print timing stats")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed for --record")
+    parser.add_argument('--log', help="write the recorded keystrokes of --record to this file")
+    parser.add_argument('--batch', metavar='DIR', help="compile every MIDI file under DIR headless, report how each fits the keymap and cache the schedules for the GUI")
+    parser.add_argument('--workers', type=int, help="processes for --batch (default: one per CPU)")
+    parser.add_argument('--no-cache', action='store_true', help="do not write the schedules compiled by --batch")
+    parser.add_argument('--cache-max-mb', type=int, default=SCHEDULE_CACHE_MAX_BYTES // (1024 * 1024), help="schedule cache size kept after --batch")
+    args, qt_args = parser.parse_known_args()
+    if args.record:
+        record_playback(args.record, args.speed, args.log)
+        sys.exit()
+    if args.batch:
+        print_batch(args.batch, args.workers, not args.no_cache, args.cache_max_mb * 1024 * 1024)
+        sys.exit()
+
+    app = QApplication(sys.argv[:1] + qt_args)
     ex = MyApp()
+    ex.backend_name = args.backend
     sys.exit(app.exec())
@@ -1,27 +1,57 @@
+import argparse
 import sys
-from PyQt6.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QFileDialog, QLabel
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPainter, QColor, QFont, QIcon
+import time
+from collections import deque
+from PyQt6.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog, QLabel, QSlider
+from PyQt6.QtCore import Qt, QRect, QRectF, QTimer, pyqtSignal
+from PyQt6.QtGui import QPainter, QColor, QFont, QIcon, QPixmap, QGuiApplication
 from mido import MidiFile
-from threading import Thread
+from threading import Event, Lock, Thread, current_thread
 import mido
+import numpy as np
 
-# List available output ports
-print(mido.get_output_names())
+DEFAULT_PORT_NAME = 'Microsoft GS Wavetable Synth 0'
+
+def refresh_interval_ms():
+    """Milliseconds between frames of the primary screen, assuming 60 Hz when it is unknown."""
+    screen = QGuiApplication.primaryScreen()
+    refresh_rate = screen.refreshRate() if screen else 0
+    return max(1, int(1000 / (refresh_rate or 60)))
 
 class PianoKeyboard(QWidget):
+    """Piano keys whose state may be changed from any thread.
+
+    press_key and the other state methods only queue the change. The queue is drained on the GUI thread once
+    per display refresh, and only the keys whose color changed are repainted, on top of a cached pixmap of
+    the idle keyboard and its labels.
+    """
+
     def __init__(self):
         super().__init__()
         self.keys = []
         self.sustain_pedal = False
+        self.events = deque()  # deque append/popleft are atomic, so worker threads can queue without locks
+        self.background = None
+        self.probe = None  # Optional LatencyProbe told when each pressed key is drawn
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush_events)
+        self.flush_timer.start(refresh_interval_ms())
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
+    def is_lit(self, key):
+        return key['pressed'] or (key['sustained'] and self.sustain_pedal)
+
+    def key_rect(self, key):
+        x, y, width, height = key['rect']
+        return x, y, width + 1, height + 1  # The outline pen extends one pixel past the rect
+
+    def build_background(self):
+        ratio = self.devicePixelRatioF()
+        self.background = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        self.background.setDevicePixelRatio(ratio)
+        self.background.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(self.background)
         for key in self.keys:
-            if key['pressed'] or (key['sustained'] and self.sustain_pedal):
-                painter.setBrush(QColor(255, 0, 0))
-            else:
-                painter.setBrush(QColor(255, 255, 255) if key['white'] else QColor(0, 0, 0))
+            painter.setBrush(QColor(255, 255, 255) if key['white'] else QColor(0, 0, 0))
             painter.drawRect(*key['rect'])
 
         # Draw note labels below the piano keys
@@ -32,50 +62,560 @@ class PianoKeyboard(QWidget):
         for key in self.keys:
             label_rect = (key['rect'][0], key['rect'][3], key['rect'][2], 15)
             painter.drawText(*label_rect, Qt.AlignmentFlag.AlignCenter, key['label'])
+        painter.end()
+        self.background_size = self.size()
+
+    def paintEvent(self, event):
+        if self.background is None or self.background_size != self.size():
+            self.build_background()
+        painter = QPainter(self)
+        painter.setClipRect(event.rect())
+        painter.drawPixmap(0, 0, self.background)
+        painter.setBrush(QColor(255, 0, 0))
+        now = time.perf_counter()
+        for note, key in enumerate(self.keys):
+            if self.is_lit(key) and event.rect().intersects(QRect(*self.key_rect(key))):
+                painter.drawRect(*key['rect'])
+                if self.probe:
+                    self.probe.painted(note, now)
+
+    def flush_events(self):
+        """Applies the queued state changes and schedules a repaint of the keys that changed color."""
+        if not self.events:
+            return
+        lit_before = {}
+
+        def touch(note):
+            lit_before.setdefault(note, self.is_lit(self.keys[note]))
+
+        while self.events:
+            kind, note = self.events.popleft()
+            if kind == 'press':
+                touch(note)
+                self.keys[note]['pressed'] = True
+                self.keys[note]['sustained'] = False
+            elif kind == 'release':
+                touch(note)
+                self.keys[note]['pressed'] = False
+                self.keys[note]['sustained'] = self.sustain_pedal  # Held by the pedal until it is lifted
+            elif kind == 'sustain_on':
+                self.sustain_pedal = True
+            elif kind == 'sustain_off':
+                for i, key in enumerate(self.keys):
+                    if key['sustained']:
+                        touch(i)
+                        key['sustained'] = False
+                self.sustain_pedal = False
+            elif kind == 'reset':
+                for i, key in enumerate(self.keys):
+                    if key['pressed'] or key['sustained']:
+                        touch(i)
+                        key['pressed'] = key['sustained'] = False
+        for note, was_lit in lit_before.items():
+            lit = self.is_lit(self.keys[note])
+            if lit != was_lit:
+                self.update(*self.key_rect(self.keys[note]))  # Qt merges these into one repaint
+            if self.probe:
+                if lit and not was_lit:
+                    self.probe.repainting(note)
+                else:
+                    self.probe.discard(note)  # No repaint shows this press, so it is not timed
 
     def press_key(self, note):
-        self.keys[note]['pressed'] = True
-        self.update()
+        self.events.append(('press', note))
 
     def release_key(self, note):
-        self.keys[note]['pressed'] = False
-        if not self.sustain_pedal:
-            self.update()
+        self.events.append(('release', note))
 
     def sustain_on(self):
-        self.sustain_pedal = True
-        self.update()
+        self.events.append(('sustain_on', None))
 
     def sustain_off(self):
-        self.sustain_pedal = False
-        self.update()
+        self.events.append(('sustain_off', None))
 
     def reset_keys(self):
-        for key in self.keys:
-            key['pressed'] = False
+        self.events.append(('reset', None))
+
+class LatencyHistogram:
+    """Fixed-width bins of latencies in seconds; adding a sample is one index computation and one increment."""
+
+    def __init__(self, bin_ms=0.1, max_ms=100.0):
+        self.bin = bin_ms / 1000
+        self.counts = [0] * (int(max_ms / bin_ms) + 1)  # The last bin collects everything at or above max_ms
+        self.total = 0.0
+        self.worst = float('-inf')
+
+    def add(self, seconds):
+        self.counts[min(max(int(seconds / self.bin), 0), len(self.counts) - 1)] += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def percentile(self, p):
+        """Upper edge of the bin holding the p-th percentile (capped at the largest sample), in seconds."""
+        target = p / 100 * len(self)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min((i + 1) * self.bin, self.worst)
+        return 0.0
+
+    def summary(self):
+        count = len(self)
+        if not count:
+            return 'no samples'
+        ms = lambda seconds: f"{seconds * 1000:.3f}"
+        return (f"n={count} mean={ms(self.total / count)} p50={ms(self.percentile(50))} p90={ms(self.percentile(90))} "
+                f"p99={ms(self.percentile(99))} max={ms(self.worst)} ms")
+
+class LatencyProbe:
+    """Timestamps events at each stage of playback: scheduled, sent to the port and painted on the keyboard.
+
+    PlaybackEngine reports every message before and after dispatching it. PianoKeyboard reports when
+    flush_events schedules a repaint that lights a pressed key, and when that key is drawn; presses that never
+    change the key's color (already held by the pedal, or released within one flush) are not timed. Dispatch
+    lateness (sent - scheduled) and paint latency (painted - scheduled) go into histograms; with keep_events
+    every message also gets a per-event record for dump().
+    """
+
+    def __init__(self, keep_events=False):
+        self.dispatch = LatencyHistogram()
+        self.paint = LatencyHistogram()
+        self.keep_events = keep_events
+        self.events = []  # [index, message type, note, scheduled, sent, painted]
+        self.presses = {}  # note -> record of a press not yet applied by flush_events
+        self.pending = {}  # note -> record of a press whose repaint is scheduled but not drawn yet
+
+    def begin(self, index, msg, scheduled):
+        """Called before dispatch, so the press is registered before the keyboard can see it; returns the record for sent()."""
+        record = [index, msg.type, getattr(msg, 'note', ''), scheduled, None, None]
+        if msg.type == 'note_on' and msg.velocity > 0:
+            self.presses[msg.note] = record
+        if self.keep_events:
+            self.events.append(record)
+        return record
+
+    def sent(self, record, now):
+        record[4] = now
+        self.dispatch.add(now - record[3])
+
+    def repainting(self, note):
+        # dict.pop is atomic, so these are safe against the engine thread
+        record = self.presses.pop(note, None)
+        if record is not None:
+            self.pending[note] = record
+
+    def discard(self, note):
+        self.presses.pop(note, None)
+        self.pending.pop(note, None)
+
+    def painted(self, note, now):
+        record = self.pending.pop(note, None)
+        if record is not None:
+            record[5] = now
+            self.paint.add(now - record[3])
+
+    def summary(self):
+        return f"dispatch lateness: {self.dispatch.summary()}\npaint latency: {self.paint.summary()}"
+
+    def dump(self, path):
+        """Writes the summary as comment lines, then one tab-separated line per recorded event."""
+        with open(path, 'w') as f:
+            for line in self.summary().splitlines():
+                f.write(f"# {line}\n")
+            f.write("# index\ttype\tnote\tscheduled\tsent\tpainted\n")
+            for index, kind, note, scheduled, sent, painted in self.events:
+                sent = '' if sent is None else f'{sent:.6f}'
+                painted = '' if painted is None else f'{painted:.6f}'
+                f.write(f"{index}\t{kind}\t{note}\t{scheduled:.6f}\t{sent}\t{painted}\n")
+
+class EventTimeline:
+    """Every message of a MIDI file merged into one array of absolute times in seconds, tempo changes applied."""
+
+    def __init__(self, midi_file):
+        times = []
+        self.messages = []
+        now = 0.0
+        for msg in midi_file:  # Iterating a MidiFile merges the tracks and converts ticks to seconds
+            now += msg.time
+            if not msg.is_meta:
+                times.append(now)
+                self.messages.append(msg)
+        self.times = np.array(times, dtype=np.float64)
+        self.duration = now
+        # Messages that set channel state which later notes depend on
+        self.state_indices = np.array([i for i, msg in enumerate(self.messages) if msg.type in ('program_change', 'control_change', 'pitchwheel')], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def state_at(self, index):
+        """The channel state set before message index (programs, controllers, pitch bend), to replay after a seek.
+
+        Messages are returned in score order. Reset All Controllers (CC121) forgets the controller values
+        before it on its channel, other channel-mode messages (CC120-127) are left out, and RPN/NRPN data
+        entry is kept per parameter, preceded by the parameter selection it was meant for.
+        """
+        latest = {}  # key -> (index of the message that set it, messages to replay)
+        selection = {}  # channel -> (msb control, lsb control) of the last RPN or NRPN selected
+        for i in self.state_indices[:np.searchsorted(self.state_indices, index)].tolist():
+            msg = self.messages[i]
+            if msg.type != 'control_change':
+                latest[(msg.type, msg.channel)] = (i, [msg])
+                continue
+            channel, control = msg.channel, msg.control
+            if control == 121:
+                for key in [key for key in latest if key[1] == channel and key[0] != 'program_change']:
+                    del latest[key]
+                selection.pop(channel, None)
+                latest[('control_change', channel, control)] = (i, [msg])
+            elif control >= 120 or control in (96, 97):
+                continue  # Mode messages, and relative data increments that cannot be replayed on their own
+            elif control in (98, 99, 100, 101):
+                selection[channel] = (101, 100) if control in (100, 101) else (99, 98)
+                latest[('control_change', channel, control)] = (i, [msg])
+            elif control in (6, 38) and channel in selection:
+                msb, lsb = selection[channel]
+                selected = [latest.get(('control_change', channel, c)) for c in (msb, lsb)]
+                if None in selected:
+                    continue  # Only half a parameter number was sent
+                values = [entry[1][-1].value for entry in selected]
+                select = [mido.Message('control_change', channel=channel, control=c, value=v) for c, v in zip((msb, lsb), values)]
+                latest[('data', channel, msb, *values, control)] = (i, select + [msg])
+            else:
+                latest[('control_change', channel, control)] = (i, [msg])
+        return [msg for _, messages in sorted(latest.values(), key=lambda entry: entry[0]) for msg in messages]
+
+    def index_at(self, seconds):
+        """Index of the first message at or after the given time."""
+        return int(np.searchsorted(self.times, seconds, side='left'))
+
+class PlaybackEngine:
+    """Dispatches an EventTimeline from its own thread against time.perf_counter.
+
+    Supports pause/resume, seeking and speed changes; all of them, and stop, take effect immediately
+    because the thread waits on an event instead of sleeping between messages. After a seek and on every
+    resume, the channel state skipped over (programs, controllers, pitch bend) is dispatched first.
+    """
+
+    def __init__(self, timeline, dispatch, on_finished=None, spin_ms=1.0, probe=None):
+        self.timeline = timeline
+        self.dispatch = dispatch
+        self.on_finished = on_finished
+        self.probe = probe
+        self.spin = spin_ms / 1000
+        self.speed = 1.0
+        self.index = 0
+        self.anchor = 0.0  # Score position in seconds at wall-clock time origin
+        self.origin = 0.0
+        self.running = False
+        self.restore = []  # State messages to dispatch before continuing, see EventTimeline.state_at
+        self.lock = Lock()
+        self.wake = Event()
+        self.thread = None
+
+    def _position(self, now):
+        return self.anchor + (now - self.origin) * self.speed if self.running else self.anchor
+
+    def position(self):
+        with self.lock:
+            return self._position(time.perf_counter())
+
+    def play(self):
+        with self.lock:
+            if self.running:
+                return
+            self.origin = time.perf_counter()
+            self.running = True
+            self.restore = self.timeline.state_at(self.index)
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def pause(self):
+        with self.lock:
+            if not self.running:
+                return
+            self.anchor = self._position(time.perf_counter())
+            self.running = False
+        self.wake.set()
+        self._join()
+
+    def stop(self):
+        self.pause()
+        self.seek(0.0)
+
+    def seek(self, seconds):
+        with self.lock:
+            self.anchor = min(max(seconds, 0.0), self.timeline.duration)
+            self.origin = time.perf_counter()
+            self.index = self.timeline.index_at(self.anchor)
+            self.restore = self.timeline.state_at(self.index)
+        self.wake.set()
+
+    def set_speed(self, speed):
+        with self.lock:
+            now = time.perf_counter()
+            self.anchor = self._position(now)
+            self.origin = now
+            self.speed = speed
+        self.wake.set()
+
+    def _join(self):
+        if self.thread is not None and self.thread is not current_thread():
+            self.thread.join()
+
+    def _run(self):
+        times = self.timeline.times
+        messages = self.timeline.messages
+        while True:
+            self.wake.clear()
+            with self.lock:
+                if not self.running:
+                    return
+                now = time.perf_counter()
+                position = self._position(now)
+                start = self.index
+                end = max(start, int(np.searchsorted(times, position, side='right')))
+                self.index = end
+                wait = (times[end] - position) / self.speed if end < len(times) else None
+                origin, anchor, speed = self.origin, self.anchor, self.speed
+                restore, self.restore = self.restore, []
+            for msg in restore:
+                self.dispatch(msg)
+            for i in range(start, end):
+                if self.probe:
+                    record = self.probe.begin(i, messages[i], origin + (times[i] - anchor) / speed)
+                self.dispatch(messages[i])
+                if self.probe:
+                    self.probe.sent(record, time.perf_counter())
+            if wait is None:
+                with self.lock:
+                    self.anchor = self.timeline.duration
+                    self.running = False
+                if self.on_finished:
+                    self.on_finished()
+                return
+            if wait > self.spin:
+                self.wake.wait(wait - self.spin)
+            else:
+                deadline = now + wait
+                while time.perf_counter() < deadline and not self.wake.is_set():
+                    pass
+
+class NoteIndex:
+    """Notes of an EventTimeline as (start, end, pitch) intervals, indexed for time-window queries.
+
+    Notes are sorted by start time. Every `checkpoint` seconds the ids of the notes sounding at that instant are
+    stored, so the notes overlapping any window are found from one checkpoint list plus a contiguous slice of
+    the start-sorted arrays, in O(log n + k) for k visible notes.
+    """
+
+    def __init__(self, timeline, checkpoint=1.0):
+        starts, ends, pitches = [], [], []
+        sounding = {}
+        for time_, msg in zip(timeline.times, timeline.messages):
+            if msg.type not in ('note_on', 'note_off'):
+                continue
+            key = (msg.channel, msg.note)
+            if msg.type == 'note_on' and msg.velocity > 0:
+                sounding.setdefault(key, deque()).append(time_)
+            elif sounding.get(key):
+                starts.append(sounding[key].popleft())  # The earliest unreleased note_on owns this note_off
+                ends.append(time_)
+                pitches.append(msg.note)
+        for (_, note), pending in sounding.items():
+            for start in pending:  # Never released; let it ring to the end of the file
+                starts.append(start)
+                ends.append(timeline.duration)
+                pitches.append(note)
+
+        order = np.argsort(starts, kind='stable')
+        self.starts = np.array(starts, dtype=np.float64)[order]
+        self.ends = np.array(ends, dtype=np.float64)[order]
+        self.pitches = np.array(pitches, dtype=np.int16)[order]
+        self.checkpoint = checkpoint
+
+        # Checkpoint c holds the notes with start <= c * checkpoint < end, stored CSR-style
+        first = np.ceil(self.starts / checkpoint).astype(np.int64)
+        last = np.ceil(self.ends / checkpoint).astype(np.int64) - 1
+        counts = np.maximum(last - first + 1, 0)
+        num_checkpoints = int(last.max()) + 2 if len(last) else 1
+        ids = np.repeat(np.arange(len(counts)), counts)
+        offsets_in_note = np.arange(len(ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        slots = first[ids] + offsets_in_note
+        order = np.argsort(slots, kind='stable')
+        self.checkpoint_ids = ids[order]
+        self.checkpoint_offsets = np.searchsorted(slots[order], np.arange(num_checkpoints + 1))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def query(self, begin, end):
+        """Indices of the notes overlapping [begin, end), sorted by start time."""
+        c = min(max(int(begin // self.checkpoint), 0), len(self.checkpoint_offsets) - 2)
+        ids = self.checkpoint_ids[self.checkpoint_offsets[c]:self.checkpoint_offsets[c + 1]]
+        ids = ids[self.ends[ids] > begin]  # Sounding at the checkpoint and still sounding at begin
+        low = int(np.searchsorted(self.starts, c * self.checkpoint, side='right'))
+        high = int(np.searchsorted(self.starts, end, side='left'))
+        later = np.arange(low, max(low, high))
+        later = later[self.ends[later] > begin]  # Started after the checkpoint
+        return np.concatenate((ids, later))
+
+class PianoRoll(QWidget):
+    """Falling-notes view: the notes of the next `lookahead` seconds descend onto the keyboard below."""
+
+    def __init__(self, key_width, lookahead=3.0):
+        super().__init__()
+        self.key_width = key_width
+        self.lookahead = lookahead
+        self.index = None
+        self.position = None  # Callable returning the playback position in seconds
+        self.shown_position = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.advance)
+        self.timer.start(refresh_interval_ms())
+
+    def set_notes(self, index, position):
+        self.index = index
+        self.position = position
+        self.shown_position = None
         self.update()
 
-class MidiPlayer(QWidget):
+    def advance(self):
+        if self.position is not None and self.position() != self.shown_position:
+            self.update()  # Only repaint while the playback position moves
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        if self.index is None:
+            return
+        now = self.position()
+        self.shown_position = now
+        visible = self.index.query(now, now + self.lookahead)
+        if not len(visible):
+            return
+        scale = self.height() / self.lookahead
+        bottoms = self.height() - (self.index.starts[visible] - now) * scale
+        tops = self.height() - (self.index.ends[visible] - now) * scale
+        xs = self.index.pitches[visible] * self.key_width
+        black = np.isin(self.index.pitches[visible] % 12, (1, 4, 6, 9, 11))  # Same layout as the keyboard
+        for color, mask in ((QColor(255, 0, 0), ~black), (QColor(160, 0, 0), black)):
+            painter.setBrush(color)
+            painter.drawRects([QRectF(x, top, self.key_width, bottom - top) for x, top, bottom in zip(xs[mask].tolist(), tops[mask].tolist(), bottoms[mask].tolist())])
+
+def available_ports():
+    """Names of the MIDI outputs, or an empty list when no MIDI backend (e.g. python-rtmidi) is installed."""
+    try:
+        return mido.get_output_names()
+    except (ImportError, OSError):
+        return []
+
+class LoopbackPort:
+    """In-process output that records (time.perf_counter(), message) instead of making sound, for headless runs."""
+
+    name = 'loopback'
+
     def __init__(self):
+        self.sent = deque()
+
+    def send(self, msg):
+        self.sent.append((time.perf_counter(), msg))
+
+    def close(self):
+        pass
+
+class PortManager:
+    """Owns one MIDI output that stays open for the life of the player.
+
+    The port is opened by name (the Windows GS synth when it exists, otherwise the first output), as a
+    virtual port others can connect to, or as a LoopbackPort. all_notes_off silences it with a few
+    controller messages instead of closing and reopening it.
+    """
+
+    def __init__(self, name=None, virtual=False, loopback=False):
+        if loopback:
+            self.port = LoopbackPort()
+        elif virtual:
+            self.port = mido.open_output(name or 'Piano Visualizer', virtual=True)
+        else:
+            if name is None:
+                names = available_ports()
+                name = DEFAULT_PORT_NAME if DEFAULT_PORT_NAME in names else (names[0] if names else None)
+            self.port = mido.open_output(name)
+
+    @property
+    def name(self):
+        return self.port.name
+
+    def send(self, msg):
+        self.port.send(msg)
+
+    def all_notes_off(self):
+        for channel in range(16):
+            self.port.send(mido.Message('control_change', channel=channel, control=64, value=0))  # Sustain off
+            self.port.send(mido.Message('control_change', channel=channel, control=123, value=0))  # All notes off
+            self.port.send(mido.Message('control_change', channel=channel, control=120, value=0))  # All sound off
+
+    def close(self):
+        self.port.close()
+
+class MidiPlayer(QWidget):
+    playbackFinished = pyqtSignal()
+
+    def __init__(self, output=None, probe=None):
         super().__init__()
+        self.probe = probe
+        self.trace_path = None
         self.midi_file = None
-        self.output = mido.open_output('Microsoft GS Wavetable Synth 0')
+        self.timeline = None
+        self.engine = None
+        self.output = output or PortManager()
         self.playing = False
         self.init_ui()
+        self.playbackFinished.connect(self.on_playback_finished)
 
     def init_ui(self):
         self.piano = PianoKeyboard()
+        self.piano.probe = self.probe
+        self.piano_roll = PianoRoll(key_width=10)
+        self.piano_roll.setFixedHeight(300)
         self.load_button = QPushButton('Load MIDI File', self)
         self.load_button.clicked.connect(self.load_midi)
         self.play_button = QPushButton('Play', self)
         self.play_button.clicked.connect(self.play_midi)
+        self.pause_button = QPushButton('Pause', self)
+        self.pause_button.clicked.connect(self.pause_midi)
         self.stop_button = QPushButton('Stop', self)
         self.stop_button.clicked.connect(self.stop_midi)
 
+        self.position_slider = QSlider(Qt.Orientation.Horizontal, self)
+        self.position_slider.setRange(0, 0)
+        self.position_slider.sliderReleased.connect(self.seek_midi)
+        self.position_slider.actionTriggered.connect(self.on_position_action)
+        self.speed_slider = QSlider(Qt.Orientation.Horizontal, self)
+        self.speed_slider.setRange(25, 200)  # 25% to 200% speed
+        self.speed_slider.setValue(100)
+        self.speed_slider.valueChanged.connect(self.update_speed)
+        self.speed_label = QLabel('Speed: 100%', self)
+        self.position_timer = QTimer(self)
+        self.position_timer.timeout.connect(self.update_position)
+        self.position_timer.start(200)
+
         self.vbox = QVBoxLayout()
+        self.vbox.addWidget(self.piano_roll)
         self.vbox.addWidget(self.piano)
+        self.vbox.addWidget(self.position_slider)
+        speed_box = QHBoxLayout()
+        speed_box.addWidget(self.speed_label)
+        speed_box.addWidget(self.speed_slider)
+        self.vbox.addLayout(speed_box)
         self.vbox.addWidget(self.load_button)
         self.vbox.addWidget(self.play_button)
+        self.vbox.addWidget(self.pause_button)
         self.vbox.addWidget(self.stop_button)
         self.setLayout(self.vbox)
 
@@ -89,7 +629,7 @@ class MidiPlayer(QWidget):
             self.piano.keys.append({'rect': (x, 0, key_width, key_height), 'white': white, 'pressed': False, 'sustained': False, 'label': note_label})
 
         total_piano_width = key_width * 128
-        self.setFixedSize(total_piano_width, key_height + 150)
+        self.setFixedSize(total_piano_width, key_height + 550)
         self.setWindowTitle("Piano Visualizer")
 
         app_icon = QIcon(r"iconsMIDI\piano.ico")  # Replace with the path to your icon image
@@ -100,42 +640,131 @@ class MidiPlayer(QWidget):
         file_name, _ = QFileDialog.getOpenFileName(self, "Load MIDI File", "", "MIDI Files (*.mid)")
         if file_name:
             self.midi_file = MidiFile(file_name)
+            self.timeline = EventTimeline(self.midi_file)
+            self.engine = PlaybackEngine(self.timeline, self.dispatch_message, on_finished=self.playbackFinished.emit, probe=self.probe)
+            self.engine.set_speed(self.speed_slider.value() / 100)
+            self.piano_roll.set_notes(NoteIndex(self.timeline), self.engine.position)
+            self.position_slider.setRange(0, int(self.timeline.duration * 1000))
+            self.position_slider.setValue(0)
 
     def play_midi(self):
-        if self.midi_file:
+        if self.engine:
+            if self.engine.position() >= self.timeline.duration:
+                self.engine.seek(0.0)
             self.playing = True
-            self.thread = Thread(target=self.play_midi_thread)
-            self.thread.start()
-
-    def play_midi_thread(self):
-        for msg in self.midi_file.play():
-            if not self.playing:
-                break
-            if msg.type == 'note_on':
-                if msg.velocity > 0:
-                    self.piano.press_key(msg.note)
-                else:
-                    self.piano.release_key(msg.note)
-            elif msg.type == 'note_off':
-                self.piano.release_key(msg.note)
-            elif msg.type == 'control_change' and msg.control == 64:
-                if msg.value >= 64:
-                    self.piano.sustain_on()
-                else:
-                    self.piano.sustain_off()
-            self.output.send(msg)
+            self.engine.play()
 
-    def stop_midi(self):
+    def pause_midi(self):
+        if self.engine:
+            self.playing = False
+            self.engine.pause()
+            self.silence()  # Resuming restores the channel state this clears
+
+    def seek_midi(self):
+        self.seek_to(self.position_slider.value())
+
+    def on_position_action(self, action):
+        # Clicks on the groove and key presses seek right away; drags seek once, on release
+        if action != QSlider.SliderAction.SliderMove:
+            self.seek_to(self.position_slider.sliderPosition())
+
+    def seek_to(self, milliseconds):
+        if self.engine:
+            self.silence()  # Before the seek, so it cannot undo the state the engine restores
+            self.engine.seek(milliseconds / 1000)
+
+    def update_speed(self, value):
+        self.speed_label.setText(f'Speed: {value}%')
+        if self.engine:
+            self.engine.set_speed(value / 100)
+
+    def update_position(self):
+        if self.engine and not self.position_slider.isSliderDown():
+            self.position_slider.setValue(int(self.engine.position() * 1000))
+
+    def on_playback_finished(self):
         self.playing = False
+        self.silence()
+
+    def dispatch_message(self, msg):
+        if msg.type == 'note_on':
+            if msg.velocity > 0:
+                self.piano.press_key(msg.note)
+            else:
+                self.piano.release_key(msg.note)
+        elif msg.type == 'note_off':
+            self.piano.release_key(msg.note)
+        elif msg.type == 'control_change' and msg.control == 64:
+            if msg.value >= 64:
+                self.piano.sustain_on()
+            else:
+                self.piano.sustain_off()
+        self.output.send(msg)
+
+    def silence(self):
+        """Releases every sounding note and clears the keyboard, e.g. after a seek or pause."""
         self.piano.reset_keys()
         self.piano.sustain_off()
+        self.output.all_notes_off()
 
-        self.output.reset()
+    def stop_midi(self):
+        self.playing = False
+        if self.engine:
+            self.engine.stop()
+        self.silence()
+
+    def closeEvent(self, event):
+        self.stop_midi()
         self.output.close()
-        self.output = mido.open_output('Microsoft GS Wavetable Synth 0')
+        if self.probe and self.trace_path:
+            self.probe.dump(self.trace_path)
+        super().closeEvent(event)
+
+def measure_playback(midi_path, speed=1.0, stop_after=None, trace_path=None, trace_events=False):
+    """Plays a MIDI file into a LoopbackPort without a GUI and prints throughput, dispatch lateness and stop latency."""
+    timeline = EventTimeline(MidiFile(midi_path))
+    output = PortManager(loopback=True)
+    finished = Event()
+    probe = LatencyProbe(keep_events=trace_events)
+    engine = PlaybackEngine(timeline, output.send, on_finished=finished.set, probe=probe)
+    engine.set_speed(speed)
+    began = time.perf_counter()
+    engine.play()
+    finished.wait(stop_after)
+    stopping = time.perf_counter()
+    engine.stop()
+    output.all_notes_off()
+    stopped = time.perf_counter()
+    sent = len(output.port.sent) - 48  # Minus the all-notes-off messages
+    elapsed = stopping - began
+    print(f"{sent} of {len(timeline)} messages in {elapsed:.3f} s ({sent / elapsed if elapsed else 0:.0f} msg/s)")
+    print(f"stop latency: {(stopped - stopping) * 1000:.3f} ms")
+    print(probe.summary().splitlines()[0])
+    if trace_path:
+        probe.dump(trace_path)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    player = MidiPlayer()
+    parser = argparse.ArgumentParser(description="Play MIDI files on a piano visualizer.")
+    parser.add_argument('--port', help="MIDI output name (default: the GS synth on Windows, otherwise the first output)")
+    parser.add_argument('--virtual', action='store_true', help="open a virtual output port other programs can connect to")
+    parser.add_argument('--loopback', action='store_true', help="play into an in-process port that makes no sound")
+    parser.add_argument('--list-ports', action='store_true', help="print the available MIDI outputs and exit")
+    parser.add_argument('--measure', metavar='MIDI', help="play MIDI headless into a loopback port and print throughput and stop latency")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed for --measure")
+    parser.add_argument('--stop-after', type=float, help="stop --measure after this many seconds")
+    parser.add_argument('--trace', metavar='FILE', help="record dispatch and paint latency and write a summary to FILE on exit")
+    parser.add_argument('--trace-events', action='store_true', help="also write one line per event to the --trace file")
+    args, qt_args = parser.parse_known_args()
+    if args.list_ports:
+        print('\n'.join(available_ports()))
+        sys.exit()
+    if args.measure:
+        measure_playback(args.measure, args.speed, args.stop_after, args.trace, args.trace_events)
+        sys.exit()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    probe = LatencyProbe(keep_events=args.trace_events) if args.trace else None
+    player = MidiPlayer(PortManager(args.port, args.virtual, args.loopback), probe)
+    player.trace_path = args.trace
     player.show()
     sys.exit(app.exec())
@@ -1,6 +1,38 @@
+import argparse
+import hashlib
+import mmap
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import cv2
 import numpy as np
 
+COLOR_NAMES = ("red", "green", "blue", "purple", "orange", "yellow", "brown", "black")
+RESET = '\033[0m'
+# BGR values of the 8 standard ANSI colors (30-37 foreground, 40-47 background) and of the default terminal colors
+ANSI_BGR = np.array([(0, 0, 0), (0, 0, 205), (0, 205, 0), (0, 205, 205), (238, 0, 0), (205, 0, 205), (205, 205, 0), (229, 229, 229)], dtype=np.uint8)
+DEFAULT_FG = (229, 229, 229)
+DEFAULT_BG = (0, 0, 0)
+GRAY_CHARS = " ░▒▓█"
+BG_COLORS = {
+    "red": '\033[41m',
+    "green": '\033[42m',
+    "blue": '\033[44m',
+    "yellow": '\033[43m',
+    "purple": '\033[45m',  # Added for purple
+    "orange": '\033[33m',
+    "cyan": '\033[36m',
+    "brown": '\033[46m',  # Adjusted for brown
+}
+LUT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "video2ascii")
+LUT_CACHE_MAX_BYTES = 72 * 1024 * 1024  # Four full 8-bit tables of 16 MB each, plus headroom
+
 def get_dominant_color(bgr_pixel):
     b, g, r = bgr_pixel
     if r >= g and r >= b and r >= 128:  # Check for sufficiently bright red
@@ -21,30 +53,41 @@ def get_dominant_color(bgr_pixel):
     else:
         return "black"  # Set black as the dominant color for other pixels
     
-def calculate_adaptive_resize_factor(frame):
+def calculate_adaptive_resize_factor(frame, analysis_width=64):
+    """Returns a content-based multiplier for resize_factor, measured on a small grayscale copy of the frame."""
+    height = max(1, round(frame.shape[0] * analysis_width / frame.shape[1]))
+    small = cv2.resize(frame, (analysis_width, height), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
     # Combine multiple techniques for a robust calculation
-    resize_factor1 = analyze_frequency_content(frame)  # Adjusts for areas with high-frequency details
-    resize_factor2 = analyze_edge_density(frame)  # Differentiates near and far objects based on edge presence
+    resize_factor1 = analyze_frequency_content(gray)  # Adjusts for areas with high-frequency details
+    resize_factor2 = analyze_edge_density(gray)  # Differentiates near and far objects based on edge presence
     # Blend factors using weights based on your priorities
     resize_factor = 0.7 * resize_factor1 + 0.3 * resize_factor2
     return resize_factor
 
-def analyze_frequency_content(frame):
-    # Calculate the frame's Fourier transform
-    fft = cv2.dft(frame, dft_flags=cv2.DFT_COMPLEX_OUTPUT)
-    # Analyze magnitude spectrum to identify high-frequency areas
-    mag_spectrum = np.abs(fft)
-    high_freq_mask = cv2.threshold(mag_spectrum, 20, 255, cv2.THRESH_BINARY)[1]  # Adjust threshold levels
-    # Calculate a resize factor based on the mask density
-    resize_factor = 1 + (np.count_nonzero(high_freq_mask) / np.prod(high_freq_mask.shape)) * 0.5
+def analyze_frequency_content(gray):
+    # Calculate the frame's Fourier transform (cv2.dft needs a single float channel)
+    fft = cv2.dft(gray.astype(np.float32), flags=cv2.DFT_COMPLEX_OUTPUT)
+    # Analyze magnitude spectrum to identify high-frequency energy
+    mag_spectrum = cv2.magnitude(fft[..., 0], fft[..., 1])
+    mag_spectrum[0, 0] = 0  # Ignore the DC term (overall brightness)
+    rows, cols = mag_spectrum.shape
+    fy = np.minimum(np.arange(rows), rows - np.arange(rows))[:, None] / rows
+    fx = np.minimum(np.arange(cols), cols - np.arange(cols))[None, :] / cols
+    high_freq_mask = np.maximum(fy, fx) > 0.125  # Outside the lowest quarter of frequencies
+    total = mag_spectrum.sum()
+    # Calculate a resize factor based on the share of high-frequency energy
+    resize_factor = 1 + (mag_spectrum[high_freq_mask].sum() / total if total else 0) * 0.5
     return resize_factor
 
-def analyze_edge_density(frame):
+def analyze_edge_density(gray):
     # Apply Canny edge detection
-    edges = cv2.Canny(frame, 50, 150)
-    # Calculate edge density in different regions (e.g., foreground, background)
-    foreground_mask = ...  # Define your foreground mask (e.g., based on object detection or segmentation)
-    foreground_edge_density = np.count_nonzero(edges & foreground_mask) / np.count_nonzero(foreground_mask)
+    edges = cv2.Canny(gray, 50, 150)
+    # Calculate edge density in different regions; the central half of the frame stands in for the foreground
+    rows, cols = edges.shape
+    foreground_mask = np.zeros_like(edges, dtype=bool)
+    foreground_mask[rows // 4:rows - rows // 4, cols // 4:cols - cols // 4] = True
+    foreground_edge_density = np.count_nonzero(edges[foreground_mask]) / max(np.count_nonzero(foreground_mask), 1)
     background_edge_density = np.count_nonzero(edges) / np.prod(edges.shape)
     # Determine resize factor based on edge density difference
     if foreground_edge_density > background_edge_density:
@@ -53,83 +96,797 @@ def analyze_edge_density(frame):
         resize_factor = 1 + (background_edge_density - foreground_edge_density) * 0.3
     return resize_factor
 
-def create_ascii_frame(frame, gray_chars, bg_colors, resize_factor=0.1):
-    """Converts a video frame into an ASCII art representation."""
-    resized = cv2.resize(frame, (int(frame.shape[1] * resize_factor), int(frame.shape[0] * resize_factor)))
+class AdaptiveResizeController:
+    """Picks resize_factor per frame from the frame content and time budgets for rendering and display.
+
+    Content is analyzed every analyze_every frames. The render and display stages each report their time
+    against their own budget, and the stage with the least headroom sets the budget scale. The content
+    multiplier and the budget scale are both smoothed, and the factor only moves in steps of step, so the
+    output size does not flicker.
+    """
+
+    def __init__(self, base_factor=0.1, frame_budget=None, min_factor=0.02, max_factor=0.5, analyze_every=15, smoothing=0.2, step=0.005, display_budget=None):
+        self.base_factor = base_factor
+        self.frame_budget = frame_budget
+        self.display_budget = display_budget
+        self.capacity = {}  # Stage -> budget scale at which that stage would just meet its budget
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.analyze_every = analyze_every
+        self.smoothing = smoothing
+        self.step = step
+        self.content_scale = 1.0
+        self.budget_scale = 1.0
+        self.factor = base_factor
+        self.frames = 0
+        self.lock = threading.Lock()
+
+    def next_factor(self, frame):
+        """Returns the resize_factor to render this frame with."""
+        with self.lock:
+            analyze = self.frames % self.analyze_every == 0
+            self.frames += 1
+        if analyze:
+            content_scale = calculate_adaptive_resize_factor(frame)
+            with self.lock:
+                self.content_scale += self.smoothing * (content_scale - self.content_scale)
+                self._update_factor()
+        return self.factor
+
+    def record_render_time(self, seconds):
+        """Feeds back how long a frame took to render; the factor shrinks when over budget and grows when under."""
+        self._record('render', self.frame_budget, seconds)
+
+    def record_display_time(self, seconds):
+        """Feeds back how long a frame took to encode and write to the terminal."""
+        self._record('display', self.display_budget, seconds)
+
+    def _record(self, stage, budget, seconds):
+        if not budget or seconds <= 0:
+            return
+        with self.lock:
+            # Both costs grow roughly with the number of cells, i.e. with the square of the factor
+            self.capacity[stage] = self.budget_scale * (budget / seconds) ** 0.5
+            target = min(self.capacity.values())
+            self.budget_scale += self.smoothing * (target - self.budget_scale)
+            self.budget_scale = min(max(self.budget_scale, self.min_factor / self.base_factor), self.max_factor / self.base_factor)
+            self._update_factor()
+
+    def _update_factor(self):
+        target = min(max(self.base_factor * self.content_scale * self.budget_scale, self.min_factor), self.max_factor)
+        if abs(target - self.factor) >= self.step:
+            self.factor = round(target / self.step) * self.step
+
+def classify_colors(bgr):
+    """Vectorized get_dominant_color: maps every pixel to an index into COLOR_NAMES."""
+    b, g, r = bgr[..., 0], bgr[..., 1], bgr[..., 2]
+    conditions = [
+        (r >= g) & (r >= b) & (r >= 128),  # red
+        (g > r) & (g > b) & (g >= 128),  # green
+        (b >= r) & (b >= g) & (b >= 128),  # blue
+        (r >= g) & (g > b) & (r >= 128),  # purple
+        (r >= b) & (b >= g),  # orange
+        (g >= r) & (r >= b),  # yellow
+    ]  # "brown" repeats the blue test, so it can never match
+    return np.select(conditions, range(len(conditions)), default=COLOR_NAMES.index("black")).astype(np.uint8)
+
+def palette_rule(palette):
+    """Builds a classification rule that picks the nearest color of a {name: (b, g, r)} palette."""
+    centers = np.array(list(palette.values()), dtype=np.int32)
+    def classify(bgr):
+        distances = ((bgr[..., None, :].astype(np.int32) - centers) ** 2).sum(axis=-1)
+        return distances.argmin(axis=-1).astype(np.uint8)
+    return classify
+
+def _code_parts(code):
+    """Bytecode, names and constants of a code object and, recursively, of the code nested in it."""
+    parts = [code.co_code, repr(code.co_names).encode()]
+    for const in code.co_consts:
+        # The repr of a nested code object holds its memory address, so hash its contents instead
+        parts.extend(_code_parts(const) if isinstance(const, types.CodeType) else [repr(const).encode()])
+    return parts
+
+def _value_parts(value, seen):
+    if isinstance(value, np.ndarray):
+        return [value.tobytes()]
+    if isinstance(value, types.FunctionType):
+        return _function_parts(value, seen)
+    if isinstance(value, (list, tuple)):
+        return [b"["] + [part for item in value for part in _value_parts(item, seen)] + [b"]"]
+    if isinstance(value, dict):
+        return [b"{"] + [part for item in value.items() for part in _value_parts(item, seen)] + [b"}"]
+    if isinstance(value, (bool, int, float, complex, str, bytes, frozenset, type(None))):
+        return [repr(value).encode()]
+    return []  # Modules, classes and other objects are identified by name in the bytecode only
+
+def _global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+def _function_parts(function, seen):
+    if function in seen:
+        return []
+    seen.add(function)
+    code = function.__code__
+    parts = _code_parts(code)
+    for cell in function.__closure__ or ():
+        parts.extend(_value_parts(cell.cell_contents, seen))
+    for name in sorted(_global_names(code)):
+        if name in function.__globals__:  # e.g. a module-level threshold or helper function
+            parts.append(name.encode())
+            parts.extend(_value_parts(function.__globals__[name], seen))
+    return parts
+
+def _rule_fingerprint(rule):
+    """Identifies a classification rule by its bytecode (nested code included), constants, closure and the globals it reads."""
+    return hashlib.sha1(b"\0".join(_function_parts(rule, set()))).hexdigest()
+
+def evict_lut_cache(cache_dir=LUT_CACHE_DIR, max_bytes=LUT_CACHE_MAX_BYTES):
+    """Deletes the least recently used color tables until the cache fits in max_bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith("colors-") and entry.name.endswith(".npy"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+class ColorClassifier:
+    """Quantized BGR -> color-class lookup table, built once from a vectorized rule and cached on disk.
+
+    The cache is keyed by a fingerprint of the rule's code, closure and globals; pass cache_key (e.g. a name
+    plus version) instead when the rule depends on state the fingerprint cannot see.
+    """
+
+    def __init__(self, rule=classify_colors, names=COLOR_NAMES, bits=8, cache_dir=LUT_CACHE_DIR, cache_key=None):
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8")
+        if len(names) > 256:
+            raise ValueError("at most 256 color classes are supported")
+        self.names = tuple(names)
+        self.bits = bits
+        self.shift = 8 - bits
+        self.table = self._load_or_build(rule, cache_dir, cache_key)
+
+    @classmethod
+    def from_palette(cls, palette, bits=5, cache_dir=LUT_CACHE_DIR):
+        """Classifies pixels by nearest color of a {name: (b, g, r)} palette."""
+        return cls(palette_rule(palette), tuple(palette), bits, cache_dir)
+
+    def _load_or_build(self, rule, cache_dir, cache_key=None):
+        rule_key = cache_key if cache_key is not None else _rule_fingerprint(rule)
+        key = hashlib.sha1(f"{self.names}{self.bits}{rule_key}".encode()).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"colors-{key}.npy") if cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                table = np.load(path)
+                os.utime(path)  # Mark as recently used for eviction
+                return table
+            except (OSError, ValueError):
+                pass  # Corrupt cache file, rebuild it below
+        table = self._build(rule)
+        if path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(path, table)
+                evict_lut_cache(cache_dir)
+            except OSError:
+                pass  # Caching is best effort
+        return table
+
+    def _build(self, rule):
+        # Classify the center of every quantization bin, one blue plane at a time to bound memory
+        levels = 1 << self.bits
+        values = ((np.arange(levels) << self.shift) + ((1 << self.shift) >> 1)).astype(np.uint8)
+        g, r = np.meshgrid(values, values, indexing="ij")
+        plane = np.empty((levels, levels, 3), dtype=np.uint8)
+        plane[..., 1], plane[..., 2] = g, r
+        table = np.empty((levels, levels, levels), dtype=np.uint8)
+        for i, b in enumerate(values):
+            plane[..., 0] = b
+            table[i] = rule(plane)
+        return table
+
+    def __call__(self, bgr):
+        """Classifies a whole BGR image with a single table lookup."""
+        q = bgr >> self.shift if self.shift else bgr
+        index = (q[..., 0].astype(np.intp) << (2 * self.bits)) | (q[..., 1].astype(np.intp) << self.bits) | q[..., 2]
+        return np.take(self.table, index)
+
+_default_classifier = None
+
+def get_default_classifier():
+    """Returns the exact 256^3 table for classify_colors, building or loading it on first use."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = ColorClassifier()
+    return _default_classifier
+
+def resize_frame(frame, resize_factor=0.1):
+    """Scales a frame down to one pixel per column and two pixels per terminal row."""
+    return cv2.resize(frame, (int(frame.shape[1] * resize_factor), int(frame.shape[0] * resize_factor)))
+
+def glyph_indices(resized, num_glyphs):
+    """Maps each pair of rows of a resized frame to glyph indices by brightness."""
     gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
 
-    ascii_frame = ''
-    for i in range(0, resized.shape[0], 2):
-        for j in range(0, resized.shape[1], 1):
-            color = get_dominant_color(resized[i, j])
-            bg_color_code = bg_colors.get(color, '')  # Use escape sequence for detected color
-            cell_avg = np.mean(gray[i:i+2, j:j+1])
-            index = min(int(cell_avg / 255 * len(gray_chars)), len(gray_chars) - 1)
-            ascii_frame += bg_color_code + gray_chars[index] + '\033[0m'
-        ascii_frame += '\n'
-    return ascii_frame
+    # Average each pair of rows; an odd last row keeps its own value
+    cell_avg = gray[0::2].astype(np.float64)
+    bottom = gray[1::2]
+    cell_avg[:bottom.shape[0]] = (cell_avg[:bottom.shape[0]] + bottom) / 2
+    return np.minimum((cell_avg / 255 * num_glyphs).astype(np.intp), num_glyphs - 1)
+
+def frame_cells(frame, num_glyphs, resize_factor=0.1, classifier=None):
+    """Returns a grid of cell codes (color key * num_glyphs + glyph index) for a video frame.
+
+    classifier maps BGR pixels to color keys: a ColorClassifier or one of the COLOR_MODES.
+    """
+    classifier = classifier or get_default_classifier()
+    resized = resize_frame(frame, resize_factor)
+    glyphs = glyph_indices(resized, num_glyphs)
+    colors = classifier(resized[0::2])
+    return colors.astype(np.intp) * num_glyphs + glyphs
+
+def cell_tokens(gray_chars, bg_colors, names=COLOR_NAMES):
+    """Pre-builds the escape-wrapped string for every cell code."""
+    return np.array([bg_colors.get(color, '') + char + RESET for color in names for char in gray_chars], dtype=object)
+
+def cells_to_text(cells, tokens):
+    """Joins a grid of cell codes into the frame string, one line per row."""
+    lines = np.hstack((tokens[cells], np.full((cells.shape[0], 1), '\n', dtype=object)))
+    return ''.join(lines.ravel().tolist())
+
+def create_ascii_frame(frame, gray_chars, bg_colors, resize_factor=0.1, classifier=None):
+    """Converts a video frame into an ASCII art representation."""
+    classifier = classifier or get_default_classifier()
+    cells = frame_cells(frame, len(gray_chars), resize_factor, classifier)
+    return cells_to_text(cells, cell_tokens(gray_chars, bg_colors, classifier.names))
+
+class ClassColors:
+    """8-color mode: one escape per dominant-color class, as in the classic renderer."""
+
+    def __init__(self, bg_colors, classifier=None):
+        self.classifier = classifier or get_default_classifier()
+        self.num_keys = len(self.classifier.names)
+        # Each escape resets first, since some classes set the foreground and others the background
+        self.escapes = []
+        for name in self.classifier.names:
+            code = bg_colors.get(name, '')
+            match = re.fullmatch(r'\033\[([\d;]+)m', code)
+            self.escapes.append(f'\033[0;{match[1]}m' if match else RESET + code)
+        self.codes = [bg_colors.get(name, '') for name in self.classifier.names]
+
+    def __call__(self, bgr):
+        return self.classifier(bgr)
+
+    def escape(self, key):
+        return self.escapes[key]
+
+    def cell_colors(self):
+        """Returns (foreground, background) BGR arrays indexed by color key."""
+        fg = np.tile(np.array(DEFAULT_FG, dtype=np.uint8), (self.num_keys, 1))
+        bg = np.tile(np.array(DEFAULT_BG, dtype=np.uint8), (self.num_keys, 1))
+        for key, code in enumerate(self.codes):
+            for param in re.findall(r'\d+', code):
+                if 30 <= int(param) <= 37:
+                    fg[key] = ANSI_BGR[int(param) - 30]
+                elif 40 <= int(param) <= 47:
+                    bg[key] = ANSI_BGR[int(param) - 40]
+        return fg, bg
+
+class Xterm256Colors:
+    """256-color mode: each cell's background is the nearest color of the xterm 6x6x6 cube."""
+
+    LEVELS = np.array([0, 95, 135, 175, 215, 255])
+    num_keys = 256
+
+    def __init__(self):
+        self.level_of = np.abs(np.arange(256)[:, None] - self.LEVELS).argmin(axis=1).astype(np.intp)
+        self.escapes = [f'\033[48;5;{key}m' for key in range(256)]
+
+    def __call__(self, bgr):
+        levels = self.level_of[bgr]
+        return 16 + 36 * levels[..., 2] + 6 * levels[..., 1] + levels[..., 0]
+
+    def escape(self, key):
+        return self.escapes[key]
+
+    def cell_colors(self):
+        """Returns (foreground, background) BGR arrays indexed by color key."""
+        cube = np.arange(256) - 16
+        bg = np.stack([self.LEVELS[cube % 6], self.LEVELS[cube // 6 % 6], self.LEVELS[cube // 36 % 6]], axis=-1).astype(np.uint8)
+        bg[:16] = ANSI_BGR[np.arange(16) % 8]  # Keys below 16 are never produced
+        return np.tile(np.array(DEFAULT_FG, dtype=np.uint8), (256, 1)), bg
+
+class TrueColors:
+    """24-bit mode: each cell's background is its own color, quantized to bits per channel."""
+
+    def __init__(self, bits=6):
+        self.bits = bits
+        self.shift = 8 - bits
+        self.num_keys = 1 << (3 * bits)
+        self.escapes = {}
+
+    def __call__(self, bgr):
+        q = (bgr >> self.shift).astype(np.intp)
+        return (q[..., 2] << (2 * self.bits)) | (q[..., 1] << self.bits) | q[..., 0]
+
+    def _channels(self, keys):
+        # Center of each quantization bin, as (r, g, b)
+        mask = (1 << self.bits) - 1
+        half = (1 << self.shift) >> 1
+        return [(keys >> shift & mask) << self.shift | half for shift in (2 * self.bits, self.bits, 0)]
+
+    def escape(self, key):
+        escape = self.escapes.get(key)
+        if escape is None:
+            r, g, b = self._channels(key)
+            escape = self.escapes[key] = f'\033[48;2;{r};{g};{b}m'
+        return escape
+
+    def cell_colors(self):
+        """Returns (foreground, background) BGR arrays indexed by color key."""
+        r, g, b = self._channels(np.arange(self.num_keys))
+        bg = np.stack([b, g, r], axis=-1).astype(np.uint8)
+        return np.tile(np.array(DEFAULT_FG, dtype=np.uint8), (self.num_keys, 1)), bg
+
+COLOR_MODES = {"8": ClassColors, "256": Xterm256Colors, "truecolor": TrueColors}
+
+def make_color_mode(name, bg_colors):
+    """Creates the color mode registered under name in COLOR_MODES."""
+    return ClassColors(bg_colors) if name == "8" else COLOR_MODES[name]()
+
+class AnsiEncoder:
+    """Turns grids of cell codes into ANSI text, writing a color escape only where the color changes."""
+
+    def __init__(self, gray_chars, colors):
+        self.num_glyphs = len(gray_chars)
+        self.chars = np.array(list(gray_chars), dtype=object)
+        self.char_codes = np.array(list(gray_chars), dtype='<U1')
+        self.colors = colors
+
+    def encode(self, cells):
+        """Encodes a whole frame, one line per row with a single reset at the end of each."""
+        keys, glyphs = np.divmod(cells, self.num_glyphs)
+        rows, cols = cells.shape
+        if not cols:
+            return '\n' * rows
+        # Viewing each row of single characters as one fixed-width string builds all row texts at once
+        texts = np.ascontiguousarray(self.char_codes[glyphs]).view(f'<U{cols}').ravel().tolist()
+        starts = np.ones(keys.shape, dtype=bool)
+        starts[:, 1:] = keys[:, 1:] != keys[:, :-1]
+        run_rows, run_starts = np.nonzero(starts)
+        run_keys = keys[run_rows, run_starts].tolist()
+        run_ends = np.append(run_starts[1:], 0)
+        run_ends[run_ends == 0] = cols  # A run ends at the next run's start, or at the end of its row
+        escape = self.colors.escape
+        last_row_run = np.append(run_rows[1:] != run_rows[:-1], True).tolist()
+        return ''.join([escape(key) + texts[row][start:end] + (RESET + '\n' if last else '')
+                        for row, key, start, end, last in zip(run_rows.tolist(), run_keys, run_starts.tolist(), run_ends.tolist(), last_row_run)])
+
+    def encode_span(self, cells):
+        """Encodes a contiguous run of cells from one row."""
+        keys, glyphs = np.divmod(cells, self.num_glyphs)
+        return self._encode_row(keys, glyphs)
+
+    def _encode_row(self, keys, glyphs):
+        if not len(keys):
+            return ''
+        text = ''.join(self.chars[glyphs].tolist())
+        starts = np.flatnonzero(np.diff(keys)) + 1
+        bounds = [0] + starts.tolist() + [len(text)]
+        run_keys = keys[bounds[:-1]].tolist()
+        escape = self.colors.escape
+        return ''.join([escape(key) + text[start:end] for key, start, end in zip(run_keys, bounds, bounds[1:])]) + RESET
 
 def create_color_map(frame, color_map_size):
     """Creates a color map overlaying the ASCII art."""
     resized = cv2.resize(frame, (color_map_size, color_map_size))
-    color_map = np.zeros((color_map_size, color_map_size, 3), dtype=np.uint8)
-    for i in range(color_map_size):
-        for j in range(color_map_size):
-            color_map[i, j] = resized[i, j]
-    return cv2.cvtColor(color_map, cv2.COLOR_BGR2RGB)  # Convert to RGB for display
-
-def create_combined_frame(ascii_frame, color_map):
-    """Combines ASCII art and color map into a single frame."""
-    # Example combination: Display ASCII art above color map
-    combined_frame = np.concatenate((color_map, np.full((color_map.shape[0], color_map.shape[1], 3), 255)), axis=1)
-    for i in range(len(ascii_frame)):
-        for j in range(len(ascii_frame[0])):
-            combined_frame[i, j * 2, :] = 0  # Set background for ASCII characters
-            combined_frame[i, j * 2 + 1, :] = 255
-            combined_frame[i, j * 2 + 1, 0] = 0  # Set red channel to 0 for better visibility
-            combined_frame[i, j * 2 + 1, 1] = 0  # Set green channel to 0 for better visibility
-            combined_frame[i, j * 2 + 1, 2] = ord(ascii_frame[i][j]) * 4  # Adjust character brightness
-    return combined_frame
+    return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)  # Convert to RGB for display
+
+def create_combined_frame(ascii_image, color_map):
+    """Combines a rasterized ASCII frame (BGR) and its color map (RGB, from create_color_map) side by side in a BGR frame."""
+    height = ascii_image.shape[0]
+    width = max(1, round(color_map.shape[1] * height / color_map.shape[0]))
+    color_map = cv2.cvtColor(cv2.resize(color_map, (width, height), interpolation=cv2.INTER_NEAREST), cv2.COLOR_RGB2BGR)
+    return np.concatenate((ascii_image, color_map), axis=1)
+
+# Coverage of the shade block characters and a 4x4 ordered-dither matrix to draw them with
+SHADE_COVERAGE = {' ': 0.0, '░': 0.25, '▒': 0.5, '▓': 0.75, '█': 1.0}
+BAYER_4X4 = np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]])
+
+class GlyphAtlas:
+    """Every glyph pre-rendered once as a coverage tile (0-255), indexed by glyph number."""
+
+    def __init__(self, gray_chars, tile_width=8, tile_height=16):
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tiles = np.stack([self._render(char) for char in gray_chars])
+
+    def _render(self, char):
+        tile = np.zeros((self.tile_height, self.tile_width), dtype=np.uint8)
+        if char in SHADE_COVERAGE:
+            threshold = np.tile(BAYER_4X4, (self.tile_height // 4 + 1, self.tile_width // 4 + 1))[:self.tile_height, :self.tile_width]
+            tile[threshold < SHADE_COVERAGE[char] * 16] = 255
+        else:
+            # Hershey fonts only cover ASCII; anything else is drawn as '?'
+            text = char if char.isascii() else '?'
+            scale = cv2.getFontScaleFromHeight(cv2.FONT_HERSHEY_PLAIN, self.tile_height * 3 // 4)
+            (width, height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, scale, 1)
+            origin = ((self.tile_width - width) // 2, (self.tile_height + height) // 2)
+            cv2.putText(tile, text, origin, cv2.FONT_HERSHEY_PLAIN, scale, 255, 1, cv2.LINE_AA)
+        return tile
+
+class FrameRasterizer:
+    """Composes cell grids into BGR images by gathering glyph tiles and tinting them with the cell colors."""
+
+    def __init__(self, gray_chars, colors, tile_width=8, tile_height=16):
+        self.num_glyphs = len(gray_chars)
+        self.atlas = GlyphAtlas(gray_chars, tile_width, tile_height)
+        fg, bg = colors.cell_colors()
+        self.fg = fg.astype(np.uint16)
+        self.bg = bg.astype(np.uint16)
+
+    def __call__(self, cells):
+        keys, glyphs = np.divmod(cells.astype(np.intp), self.num_glyphs)
+        coverage = self.atlas.tiles[glyphs].astype(np.uint16)[..., None]  # rows, cols, tile height, tile width, 1
+        fg = self.fg[keys][:, :, None, None, :]
+        bg = self.bg[keys][:, :, None, None, :]
+        image = (bg * (255 - coverage) + fg * coverage + 127) // 255
+        rows, cols = cells.shape
+        return image.transpose(0, 2, 1, 3, 4).reshape(rows * self.atlas.tile_height, cols * self.atlas.tile_width, 3).astype(np.uint8)
+
+def export_video(path, out_path, gray_chars, colors, resize_factor=0.1, tile_width=8, tile_height=16, fourcc="mp4v"):
+    """Renders a video as ASCII art into a regular video file instead of the terminal.
+
+    Returns the number of frames written.
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    rasterizer = FrameRasterizer(gray_chars, colors, tile_width, tile_height)
+    writer = None
+    count = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            image = rasterizer(frame_cells(frame, len(gray_chars), resize_factor, colors))
+            if writer is None:
+                writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*fourcc), fps, (image.shape[1], image.shape[0]))
+            writer.write(image)
+            count += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    return count
 
 def display_ascii_art(ascii_frame):
     """Clears the console and prints the ASCII art frame."""
     print("\033[H\033[J", end="")  # Clear console
     print(ascii_frame)
 
+class DeltaDisplay:
+    """Redraws only the terminal cells that changed since the previous frame.
+
+    Falls back to a full redraw when most of the screen changed, when the frame size changes,
+    and every keyframe_interval frames so the terminal cannot stay out of sync.
+    """
+
+    def __init__(self, encoder, full_redraw_ratio=0.5, keyframe_interval=300, stream=None):
+        self.encoder = encoder
+        self.full_redraw_ratio = full_redraw_ratio
+        self.keyframe_interval = keyframe_interval
+        self.stream = stream or sys.stdout.buffer
+        self.previous = None
+        self.frames_since_keyframe = 0
+        self.frames = 0
+        self.bytes_written = 0
+
+    def __call__(self, cells):
+        previous, self.previous = self.previous, cells
+        self.frames_since_keyframe += 1
+        if previous is None or previous.shape != cells.shape or self.frames_since_keyframe >= self.keyframe_interval:
+            output = self.full_redraw(cells)
+        else:
+            changed = cells != previous
+            if changed.mean() > self.full_redraw_ratio:
+                output = self.full_redraw(cells)
+            else:
+                output = self.changed_runs(cells, changed)
+        data = output.encode()
+        self.stream.write(data)
+        self.stream.flush()
+        self.frames += 1
+        self.bytes_written += len(data)
+        return output
+
+    def bytes_per_frame(self):
+        return self.bytes_written / self.frames if self.frames else 0.0
+
+    def full_redraw(self, cells):
+        self.frames_since_keyframe = 0
+        return "\033[H\033[J" + self.encoder.encode(cells)
+
+    def changed_runs(self, cells, changed):
+        # Find horizontal runs of changed cells so each run needs a single cursor move
+        padded = np.zeros((changed.shape[0], changed.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = changed
+        edges = np.diff(padded, axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+        encode_span = self.encoder.encode_span
+        return ''.join([f"\033[{row + 1};{start + 1}H" + encode_span(cells[row, start:end])
+                        for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist())])
+
+def play_pipelined(cap, render, display, workers=None, max_in_flight=None):
+    """Decodes, renders and displays frames in a three-stage pipeline paced to the source FPS.
+
+    A decoder thread feeds a pool of render workers, and the calling thread shows the results in order.
+    Frames that are already late are skipped, so playback never falls behind the video.
+    Returns the number of frames shown and dropped, also when playback is stopped with Ctrl+C.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_time = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+    workers = workers or os.cpu_count() or 1
+    pending = queue.Queue()
+    slots = threading.Semaphore(max_in_flight or workers * 2)  # Bounds input lag
+    stop = threading.Event()
+    clock = {'start': None, 'latency': 0.0, 'submitted': 0, 'completed': 0}
+    counts = {'shown': 0, 'skipped': 0, 'dropped': 0}  # Each count has a single writer thread
+
+    def timed_render(frame):
+        began = time.perf_counter()
+        result = render(frame)
+        clock['latency'] = 0.8 * clock['latency'] + 0.2 * (time.perf_counter() - began)
+        return result
+
+    def decode(pool):
+        index = 0
+        try:
+            while not stop.is_set():
+                if not slots.acquire(timeout=0.1):
+                    continue
+                start = clock['start']
+                # A frame is ready once the frames still in flight ahead of it drain and its own render finishes
+                in_flight = clock['submitted'] - clock['completed']
+                interval = max(frame_time, clock['latency'] / workers)
+                ready = time.perf_counter() + in_flight * interval + clock['latency']
+                if start is not None and ready > start + index * frame_time:
+                    # Too late to be shown in time: skip the frame without decoding it
+                    slots.release()
+                    if not cap.grab():
+                        break
+                    counts['skipped'] += 1
+                else:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    pending.put((index, pool.submit(timed_render, frame)))
+                    clock['submitted'] += 1
+                index += 1
+        finally:
+            pending.put(None)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        decoder = threading.Thread(target=decode, args=(pool,), daemon=True)
+        decoder.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                index, future = item
+                result = future.result()
+                clock['completed'] += 1
+                slots.release()
+                now = time.perf_counter()
+                if clock['start'] is None:
+                    clock['start'] = now - index * frame_time
+                deadline = clock['start'] + index * frame_time
+                if now - deadline > frame_time:
+                    counts['dropped'] += 1
+                    continue
+                if deadline > now:
+                    time.sleep(deadline - now)
+                display(result)
+                counts['shown'] += 1
+        except KeyboardInterrupt:  # Ctrl+C stops playback; the counts so far are still returned
+            pass
+        finally:
+            stop.set()
+            decoder.join()
+            pool.shutdown(cancel_futures=True)
+    return counts['shown'], counts['skipped'] + counts['dropped']
+
+# Pre-rendered ASCII video: header, then packed cell-code frames, then a frame index at index_offset
+ASCII_VIDEO_MAGIC = b"V2A\x01"
+ASCII_VIDEO_HEADER = struct.Struct("<4s4sQQd16s64s")  # magic, cell dtype, frame count, index offset, fps, color mode, glyphs
+ASCII_VIDEO_INDEX = np.dtype([("offset", "<u8"), ("rows", "<u4"), ("cols", "<u4")])
+
+def _render_range(path, start, stop, gray_chars, bg_colors, color_mode, resize_factor, dtype):
+    """Renders frames [start, stop) of a video to cell-code arrays; runs in a worker process."""
+    colors = make_color_mode(color_mode, bg_colors)
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frames = []
+    for _ in range(start, stop):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame_cells(frame, len(gray_chars), resize_factor, colors).astype(dtype))
+    cap.release()
+    return frames
+
+def prerender_video(path, out_path, gray_chars, bg_colors, color_mode="8", resize_factor=0.1, workers=None, chunk_frames=120):
+    """Renders a whole video into a pre-rendered ASCII video file, splitting it into frame ranges over a process pool.
+
+    Returns the number of frames written.
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    num_keys = make_color_mode(color_mode, bg_colors).num_keys
+    dtype = np.min_scalar_type(num_keys * len(gray_chars) - 1)
+    ranges = [(start, min(start + chunk_frames, total)) for start in range(0, total, chunk_frames)]
+
+    index = []
+    with open(out_path, "wb") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        out.write(b"\0" * ASCII_VIDEO_HEADER.size)
+        # map() yields ranges in order, so frames are written as soon as their range and all earlier ones finish
+        chunks = pool.map(_render_range, *zip(*[(path, start, stop, gray_chars, bg_colors, color_mode, resize_factor, dtype)
+                                                for start, stop in ranges]))
+        for frames in chunks:
+            for cells in frames:
+                index.append((out.tell(), cells.shape[0], cells.shape[1]))
+                out.write(np.ascontiguousarray(cells).tobytes())
+        index_offset = out.tell()
+        out.write(np.array(index, dtype=ASCII_VIDEO_INDEX).tobytes())
+        out.seek(0)
+        out.write(ASCII_VIDEO_HEADER.pack(ASCII_VIDEO_MAGIC, np.dtype(dtype).str.encode(), len(index), index_offset,
+                                          fps, color_mode.encode(), gray_chars.encode()))
+    return len(index)
+
+class AsciiVideo:
+    """Memory-mapped pre-rendered ASCII video; frames are zero-copy views that can be fetched in any order."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, dtype, count, index_offset, self.fps, color_mode, gray_chars = ASCII_VIDEO_HEADER.unpack_from(self.buffer)
+        if magic != ASCII_VIDEO_MAGIC:
+            raise ValueError(f"{path} is not a pre-rendered ASCII video")
+        self.dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        self.color_mode = color_mode.rstrip(b"\0").decode()
+        self.gray_chars = gray_chars.rstrip(b"\0").decode()
+        self.index = np.frombuffer(self.buffer, dtype=ASCII_VIDEO_INDEX, count=count, offset=index_offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, frame_number):
+        offset, rows, cols = self.index[frame_number].tolist()
+        return np.frombuffer(self.buffer, dtype=self.dtype, count=rows * cols, offset=offset).reshape(rows, cols)
+
+def play_prerendered(video, display, start_frame=0):
+    """Shows a pre-rendered video at its own FPS, skipping straight to the current frame when behind.
+
+    Returns the number of frames shown and skipped.
+    """
+    frame_time = 1.0 / video.fps if video.fps > 0 else 1.0 / 30
+    start = time.perf_counter() - start_frame * frame_time
+    shown = 0
+    frame_number = start_frame
+    while frame_number < len(video):
+        display(video[frame_number])
+        shown += 1
+        next_frame = frame_number + 1
+        now = time.perf_counter()
+        deadline = start + next_frame * frame_time
+        if deadline > now:
+            time.sleep(deadline - now)
+            frame_number = next_frame
+        else:
+            frame_number = max(next_frame, int((now - start) / frame_time))
+    return shown, len(video) - start_frame - shown
+
 def main():
     """Main function to capture video and display ASCII art."""
-    askVideoPath = str(input("Enter absolute path to video file without quotation marks at the start and end: "))
-    cap = cv2.VideoCapture(f"{askVideoPath}")
+    parser = argparse.ArgumentParser(description="Play a video as colored ASCII art in the terminal.")
+    parser.add_argument("video", nargs="?", help="path to the video file (asked for when omitted)")
+    parser.add_argument("--delta", action="store_true", help="only redraw the terminal cells that changed")
+    parser.add_argument("--keyframe-interval", type=int, default=300, help="frames between full redraws in --delta mode")
+    parser.add_argument("--color-mode", choices=COLOR_MODES, default="8", help="8-color classes, xterm 256 colors or 24-bit color")
+    parser.add_argument("--adaptive", action="store_true", help="adapt the resolution to the frame content and render time")
+    parser.add_argument("--frame-budget", type=float, help="render time budget per frame in ms for --adaptive (default: one source frame per render worker)")
+    parser.add_argument("--prerender", metavar="OUT", help="render the video to a pre-rendered ASCII video file and exit")
+    parser.add_argument("--export", metavar="OUT", help="render the video as ASCII art into a video file (e.g. .mp4) and exit")
+    parser.add_argument("--workers", type=int, help="worker processes for --prerender")
+    parser.add_argument("--play", metavar="FILE", help="play a pre-rendered ASCII video file")
+    parser.add_argument("--seek", type=int, default=0, help="frame number to start --play from")
+    args = parser.parse_args()
 
     red_chars = ".,-~:;=!*#$@"
     green_chars = "+oO08@"
     blue_chars = ">]`^v"
-    gray_chars = " ░▒▓█"
-    bg_colors = {
-    "red": '\033[41m',
-    "green": '\033[42m',
-    "blue": '\033[44m',
-    "yellow": '\033[43m',
-    "purple": '\033[45m',  # Added for purple
-    "orange": '\033[33m',
-    "cyan": '\033[36m',
-    "brown": '\033[46m',  # Adjusted for brown
-}
+    gray_chars = GRAY_CHARS
+    bg_colors = BG_COLORS
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Unable to read frame from video.")
-            break
+    if args.play:
+        video = AsciiVideo(args.play)
+        encoder = AnsiEncoder(video.gray_chars, make_color_mode(video.color_mode, bg_colors))
+        display = DeltaDisplay(encoder, keyframe_interval=args.keyframe_interval if args.delta else 1)
+        try:
+            shown, skipped = play_prerendered(video, display, args.seek)
+            print(f"{shown} frames shown, {skipped} skipped, {display.bytes_per_frame():.0f} bytes/frame")
+        except KeyboardInterrupt:  # Ctrl+C stops playback
+            pass
+        return
 
-        ascii_frame = create_ascii_frame(frame, gray_chars, bg_colors)
-        display_ascii_art(ascii_frame)
+    askVideoPath = args.video or str(input("Enter absolute path to video file without quotation marks at the start and end: "))
 
-        if cv2.waitKey(0) & 0xFF == ord('q'):
-            break
+    if args.prerender:
+        count = prerender_video(askVideoPath, args.prerender, gray_chars, bg_colors, args.color_mode, workers=args.workers)
+        print(f"Wrote {count} frames to {args.prerender}")
+        return
+
+    if args.export:
+        count = export_video(askVideoPath, args.export, gray_chars, make_color_mode(args.color_mode, bg_colors))
+        print(f"Wrote {count} frames to {args.export}")
+        return
+
+    cap = cv2.VideoCapture(f"{askVideoPath}")
+    colors = make_color_mode(args.color_mode, bg_colors)
+    encoder = AnsiEncoder(gray_chars, colors)
+
+    # Without --delta every frame is a keyframe, i.e. a full redraw
+    display = DeltaDisplay(encoder, keyframe_interval=args.keyframe_interval if args.delta else 1)
+    workers = os.cpu_count() or 1
+
+    if args.adaptive:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        # Frames render in parallel, so each may take workers source frames; display is serial and gets one
+        controller = AdaptiveResizeController(frame_budget=args.frame_budget / 1000 if args.frame_budget else workers / fps, display_budget=1.0 / fps)
+
+        def render(frame):
+            began = time.perf_counter()
+            cells = frame_cells(frame, len(gray_chars), controller.next_factor(frame), colors)
+            controller.record_render_time(time.perf_counter() - began)
+            return cells
+
+        def show(cells):
+            began = time.perf_counter()
+            display(cells)
+            controller.record_display_time(time.perf_counter() - began)
+    else:
+        def render(frame):
+            return frame_cells(frame, len(gray_chars), classifier=colors)
+
+        show = display
+
+    shown = dropped = 0
+    try:
+        shown, dropped = play_pipelined(cap, render, show, workers)
+    except KeyboardInterrupt:  # Ctrl+C stops playback
+        pass
+    if not shown and not dropped:  # Not a single frame was decoded
+        print("Error: Unable to read frame from video.")
+    else:
+        print(f"{shown} frames shown, {dropped} dropped, {display.bytes_per_frame():.0f} bytes/frame")
 
     cap.release()
-    cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
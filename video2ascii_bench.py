@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import video2ascii as v2a
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+def synthetic_frames(width, height, count, seed=0):
+    """Generates deterministic test frames: a color gradient, moving discs and some noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // max(width - 1, 1), y * 255 // max(height - 1, 1), (x + y) * 255 // max(width + height - 2, 1)], axis=-1).astype(np.uint8)
+    noise = rng.integers(0, 32, size=(height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = cv2.add(base, noise)
+        for k, color in enumerate([(0, 0, 255), (0, 255, 0), (255, 0, 0), (0, 255, 255)]):
+            center = (int((0.2 + 0.2 * k + 0.01 * i) % 1.0 * width), int((0.3 + 0.1 * k) * height))
+            cv2.circle(frame, center, height // 8, color, -1)
+        frames.append(frame)
+    return frames
+
+class NullStream:
+    """Binary stream that discards everything, so emitting costs no terminal time."""
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+def time_stage(function, inputs, repeat):
+    """Runs function over every input repeat times; returns per-call timings in seconds and the last outputs."""
+    timings = []
+    outputs = []
+    for _ in range(repeat):
+        outputs = []
+        for item in inputs:
+            began = time.perf_counter()
+            outputs.append(function(item))
+            timings.append(time.perf_counter() - began)
+    return timings, outputs
+
+def peak_memory(function, item):
+    """Returns the peak Python/NumPy heap growth in bytes while running function once."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        function(item)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+def summarize(timings, peak):
+    median = statistics.median(timings)
+    return {
+        "ms_median": round(median * 1000, 4),
+        "ms_mean": round(statistics.fmean(timings) * 1000, 4),
+        "fps": round(1 / median, 2) if median else None,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def benchmark_resolution(width, height, frame_count, repeat, color_mode, resize_factor, legacy):
+    frames = synthetic_frames(width, height, frame_count)
+    colors = v2a.make_color_mode(color_mode, v2a.BG_COLORS)
+    num_glyphs = len(v2a.GRAY_CHARS)
+    encoder = v2a.AnsiEncoder(v2a.GRAY_CHARS, colors)
+    stream = NullStream()
+    results = {}
+
+    def run(name, function, inputs):
+        timings, outputs = time_stage(function, inputs, repeat)
+        results[name] = summarize(timings, peak_memory(function, inputs[0]))
+        return outputs
+
+    resized = run("resize", lambda frame: v2a.resize_frame(frame, resize_factor), frames)
+    run("classify", lambda image: colors(image[0::2]), resized)
+    run("glyphs", lambda image: v2a.glyph_indices(image, num_glyphs), resized)
+    cells = [v2a.frame_cells(frame, num_glyphs, resize_factor, colors) for frame in frames]
+    texts = run("string_build", encoder.encode, cells)
+    run("emit", lambda text: stream.write(text.encode()), texts)
+    run("adaptive_resize", v2a.calculate_adaptive_resize_factor, frames[:max(1, len(frames) // 4)])
+    run("end_to_end", lambda frame: encoder.encode(v2a.frame_cells(frame, num_glyphs, resize_factor, colors)), frames)
+    if legacy:
+        run("legacy_create_ascii_frame", lambda frame: v2a.create_ascii_frame(frame, v2a.GRAY_CHARS, v2a.BG_COLORS, resize_factor), frames)
+
+    # Per-pixel cost of the scalar classifier, measured on a sample since it is far too slow for whole frames
+    pixels = resized[0].reshape(-1, 3)[:2000]
+    timings, _ = time_stage(lambda pixel: v2a.get_dominant_color(pixel), list(pixels), 1)
+    results["dominant_color_scalar_us_per_pixel"] = round(statistics.fmean(timings) * 1e6, 3)
+
+    full = v2a.DeltaDisplay(encoder, keyframe_interval=1, stream=stream)
+    delta = v2a.DeltaDisplay(encoder, stream=stream)
+    for frame_cells in cells:
+        full(frame_cells)
+        delta(frame_cells)
+    results["bytes_per_frame"] = {"full": round(full.bytes_per_frame()), "delta": round(delta.bytes_per_frame())}
+    results["cells"] = list(cells[0].shape)
+    return results
+
+def compare(results, baseline):
+    """Prints median-time ratios against a previous results file; below 1.0 is faster."""
+    for resolution, stages in results["results"].items():
+        old_stages = baseline.get("results", {}).get(resolution, {})
+        for stage, values in stages.items():
+            old = old_stages.get(stage)
+            if isinstance(values, dict) and isinstance(old, dict) and old.get("ms_median"):
+                print(f"{resolution:>6} {stage:<26} {values['ms_median'] / old['ms_median']:6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video2ascii pipeline on synthetic frames.")
+    parser.add_argument("--resolutions", nargs="+", choices=RESOLUTIONS, default=list(RESOLUTIONS))
+    parser.add_argument("--frames", type=int, default=20, help="synthetic frames per resolution")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the frames per stage")
+    parser.add_argument("--color-mode", choices=v2a.COLOR_MODES, default="8")
+    parser.add_argument("--resize-factor", type=float, default=0.1)
+    parser.add_argument("--legacy", action="store_true", help="also time create_ascii_frame")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a previous JSON results file")
+    args = parser.parse_args()
+
+    v2a.get_default_classifier()  # Build or load the color table outside the timings
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "frames": args.frames,
+            "repeat": args.repeat,
+            "color_mode": args.color_mode,
+            "resize_factor": args.resize_factor,
+        },
+        "results": {},
+    }
+    for resolution in args.resolutions:
+        width, height = RESOLUTIONS[resolution]
+        stages = benchmark_resolution(width, height, args.frames, args.repeat, args.color_mode, args.resize_factor, args.legacy)
+        results["results"][resolution] = stages
+        print(f"{resolution} ({stages['cells'][1]}x{stages['cells'][0]} cells)")
+        for stage, values in stages.items():
+            if isinstance(values, dict) and "ms_median" in values:
+                print(f"  {stage:<26} {values['ms_median']:9.3f} ms  {values['fps'] or 0:9.1f} fps  {values['peak_kb']:9.1f} KB peak")
+        print(f"  bytes/frame: full {stages['bytes_per_frame']['full']}, delta {stages['bytes_per_frame']['delta']}")
+        print(f"  get_dominant_color: {stages['dominant_color_scalar_us_per_pixel']} us/pixel")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    sys.exit(main())